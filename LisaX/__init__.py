@@ -1,7 +1,4 @@
-from pyrogram import Client
 import logging
-from config import API_ID, API_HASH, BOT_TOKEN
-from db import init_db
 
 # Setup logging
 logging.basicConfig(
@@ -10,13 +7,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger("LisaX")
 
-# Initialize database
-init_db()
-
-# Initialize the bot
-bot = Client(
-    "LisaXBot",
-    api_id=API_ID,
-    api_hash=API_HASH,
-    bot_token=BOT_TOKEN
-)
+# Handler modules, imported when the app is created
+PLUGINS = [
+    "LisaX.handlers.commands",
+    "LisaX.handlers.callback",
+    "LisaX.handlers.messages",
+    "LisaX.handlers.admin"
+]
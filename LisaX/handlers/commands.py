@@ -1,12 +1,11 @@
-from pyrogram import filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+from pyrogram.types import Message
 import time
-from db import add_user, get_users_count, get_chats_count
-from config import WELCOME_MESSAGE, HELP_MESSAGE
-from LisaX import bot
+from db import add_user
+from screens import send_screen
+from router import command
 
 # Start command handler
-@bot.on_message(filters.command("start"))
+@command("start")
 async def start_command(client, message: Message):
     """Handle the /start command"""
     # Add user to database
@@ -17,44 +16,18 @@ async def start_command(client, message: Message):
         last_name=message.from_user.last_name
     )
     
-    # Create inline keyboard
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton("📚 Help", callback_data="help"),
-                InlineKeyboardButton("📊 Stats", callback_data="stats")
-            ]
-        ]
-    )
-    
     # Send welcome message
-    await message.reply_text(
-        WELCOME_MESSAGE,
-        reply_markup=keyboard
-    )
+    await send_screen(message, "start")
 
 # Help command handler
-@bot.on_message(filters.command("help"))
+@command("help")
 async def help_command(client, message: Message):
     """Handle the /help command"""
-    # Create inline keyboard
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton("🏠 Home", callback_data="start"),
-                InlineKeyboardButton("📊 Stats", callback_data="stats")
-            ]
-        ]
-    )
-    
     # Send help message
-    await message.reply_text(
-        HELP_MESSAGE,
-        reply_markup=keyboard
-    )
+    await send_screen(message, "help")
 
 # Ping command handler
-@bot.on_message(filters.command("ping"))
+@command("ping")
 async def ping_command(client, message: Message):
     """Handle the /ping command to check bot latency"""
     # Calculate ping
@@ -67,39 +40,14 @@ async def ping_command(client, message: Message):
     await ping_message.edit_text(f"✅ Pong! `{ping_time}ms`")
 
 # Stats command handler
-@bot.on_message(filters.command("stats"))
+@command("stats")
 async def stats_command(client, message: Message):
     """Handle the /stats command to show bot statistics"""
-    # Get stats from database
-    users_count = await get_users_count()
-    chats_count = await get_chats_count()
-    
-    # Create stats message
-    stats_text = f"""
-📊 **Bot Statistics**
-
-👥 Users: {users_count}
-💬 Chats: {chats_count}
-    """
-    
-    # Create inline keyboard
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton("🏠 Home", callback_data="start"),
-                InlineKeyboardButton("📚 Help", callback_data="help")
-            ]
-        ]
-    )
-    
     # Send stats message
-    await message.reply_text(
-        stats_text,
-        reply_markup=keyboard
-    )
+    await send_screen(message, "stats")
 
 # Echo command handler
-@bot.on_message(filters.command("echo"))
+@command("echo")
 async def echo_command(client, message: Message):
     """Echo back the user's message"""
     # Check if message contains text to echo
@@ -1,25 +1,26 @@
-from pyrogram import filters
-from pyrogram.types import Message
-from db import add_user, add_chat
-from config import DEFAULT_WELCOME_MESSAGE
-from LisaX import bot
+from pyrogram import Client, filters
+from pyrogram.types import Message, ChatMemberUpdated
+from db import add_user, add_chat, mark_chat_inactive
+from utils import invalidate_chat_admins, removed_member_id
+from welcome import welcome_aggregator
 
-# Handle private messages (all messages that are not commands)
-@bot.on_message(filters.private & ~filters.command([]))
+# Track users from private messages (separate group, so it runs alongside commands)
+@Client.on_message(filters.private, group=1)
 async def handle_private_message(client, message: Message):
     """Handle private messages"""
-    # Add user to database
+    # Add user to database; a user writing to the bot can be messaged again
     await add_user(
         user_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
+        last_name=message.from_user.last_name,
+        active=True
     )
     
     # For now, we're not replying to regular messages to avoid spamming the user
 
-# Handle group messages (all messages that are not commands)
-@bot.on_message(filters.group & ~filters.command([]))
+# Track chats and users from group messages (separate group, so it runs alongside commands)
+@Client.on_message(filters.group, group=1)
 async def handle_group_message(client, message: Message):
     """Handle group messages"""
     # Add chat to database
@@ -38,12 +39,27 @@ async def handle_group_message(client, message: Message):
             last_name=message.from_user.last_name
         )
 
+# Keep the cached administrator lists in sync with promotions and demotions
+@Client.on_chat_member_updated()
+async def chat_member_updated(client, update: ChatMemberUpdated):
+    """Invalidate cached admins and stop broadcasting to chats the bot was removed from"""
+    invalidate_chat_admins(update)
+    if removed_member_id(update) == client.me.id:
+        await mark_chat_inactive(update.chat.id, "kicked")
+
+# Stop broadcasting to groups the bot was removed from (runs after tracking, which marks chats active)
+@Client.on_message(filters.left_chat_member, group=2)
+async def handle_left_chat_member(client, message: Message):
+    """Mark the chat inactive when the bot itself leaves or is removed"""
+    if message.left_chat_member.id == client.me.id:
+        await mark_chat_inactive(message.chat.id, "kicked")
+
 # Welcome new members
-@bot.on_message(filters.new_chat_members)
+@Client.on_message(filters.new_chat_members)
 async def welcome_new_members(client, message: Message):
-    """Welcome new members in groups"""
-    # Get bot's user ID
-    me = await client.get_me()
+    """Welcome new members in groups, one message per wave of joins"""
+    # Bot's own identity is fetched once when the client starts
+    me = client.me
     
     # Check if the bot was added to a new group
     for new_member in message.new_chat_members:
@@ -58,15 +74,6 @@ async def welcome_new_members(client, message: Message):
             # Send a greeting message
             await message.reply_text(f"Thanks for adding me to the group! Use /help to see available commands.")
             return
-        
-    # Welcome regular new users
-    names = [user.first_name for user in message.new_chat_members]
-    welcome_text = DEFAULT_WELCOME_MESSAGE
-    
-    if len(names) == 1:
-        welcome_text = f"Welcome, {names[0]}! 👋"
-    elif len(names) > 1:
-        formatted_names = ", ".join(names[:-1]) + f" and {names[-1]}"
-        welcome_text = f"Welcome, {formatted_names}! 👋"
     
-    await message.reply_text(welcome_text)
+    # Welcome regular new users; joins are buffered so a wave of them gets one message
+    welcome_aggregator.add(client, message.chat.id, [user.first_name for user in message.new_chat_members])
@@ -0,0 +1,158 @@
+"""
+Application factory: builds the client, storage and handler registrations once per process
+"""
+import inspect
+import logging
+import importlib
+from pyrogram import Client, idle
+from pyrogram.handlers import MessageHandler
+from pyrogram.handlers.handler import Handler
+
+from config import API_ID, API_HASH, BOT_TOKEN, METRICS_PORT, WORKER_PROCESSES
+from router import CommandRouter
+from db import init_db, ping_db, init_counters, close_db, create_indexes, update_bot_stats, warm_known_ids
+from broadcast import resume_broadcast_jobs, shutdown_broadcast_jobs
+from metrics import instrument_client, instrument_router, start_metrics_server, runtime_sampler
+from priority import install_priority_queue
+from outbound import install_outbound_scheduler
+from history import stats_recorder
+from throttle import throttle
+from welcome import welcome_aggregator
+from startup import Startup
+from workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+def load_plugins(client, router, modules):
+    """Import handler modules and register what they declare with @Client.on_* and @command"""
+    registered = set()
+    for name in modules:
+        module = importlib.import_module(name)
+        for value in vars(module).values():
+            # A function imported into several plugin modules is registered once
+            if not inspect.isfunction(value) or value in registered:
+                continue
+            registered.add(value)
+            
+            for handler, group in getattr(value, "handlers", []):
+                if isinstance(handler, Handler):
+                    client.add_handler(handler, group)
+            if getattr(value, "commands", None):
+                router.command(*value.commands)(value)
+        
+        logger.debug(f"Loaded plugin {name}")
+
+class App:
+    """One bot process: its client, command router and startup/shutdown sequence"""
+
+    def __init__(self, name, plugins, client_options=None):
+        self.name = name
+        self.plugins = list(plugins)
+        self.client_options = dict(client_options or {})
+        self.startup = Startup()
+        
+        # The client picks up the running event loop, so apps are built inside it
+        self.bot = Client(name, api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, **self.client_options)
+        
+        # Commands from every plugin share one dispatcher handler, throttled per user and chat
+        self.router = CommandRouter(throttle=throttle)
+        self.bot.add_handler(MessageHandler(self.router.dispatch, self.router.filter))
+        load_plugins(self.bot, self.router, self.plugins)
+
+    async def _prepare_database(self):
+        """Check the database and seed the counters"""
+        if not await self.startup.step("database health check", ping_db):
+            raise RuntimeError("Database health check failed")
+        await self.startup.step("counters", init_counters)
+
+    async def _start_instrumentation(self):
+        """Record latency of every handler, command and Telegram API call"""
+        instrument_client(self.bot)
+        instrument_router(self.router)
+        runtime_sampler.start()
+        if METRICS_PORT:
+            await start_metrics_server(METRICS_PORT)
+
+    async def start(self):
+        """Connect, check the database and start handling updates"""
+        startup = self.startup
+        
+        # Hand updates to worker processes instead of handling them here
+        if WORKER_PROCESSES > 0:
+            startup.pool = WorkerPool(self.bot, create_app, (self.name, self.plugins, self.client_options), WORKER_PROCESSES)
+            await startup.step("worker processes", startup.pool.start)
+        else:
+            # Commands and button presses are handled ahead of background tracking
+            install_priority_queue(self.bot, self.router.prefixes)
+        
+        # Every send and edit, including those made for worker processes, is rate-limited here
+        install_outbound_scheduler(self.bot)
+        
+        # Connecting to Telegram and checking the database do not depend on each other
+        logger.info("Starting bot...")
+        await startup.parallel(
+            ("telegram", self.bot.start),
+            ("database", self._prepare_database)
+        )
+        if startup.pool is not None:
+            startup.pool.connected.set()
+        await startup.step("instrumentation", self._start_instrumentation)
+        
+        # Bot information is fetched once by bot.start()
+        logger.info(
+            f"Bot started as @{self.bot.me.username}, ready in {startup.elapsed:.2f}s "
+            f"({startup.since_process_start():.2f}s since process start)"
+        )
+        
+        # Non-critical work runs while updates are already being handled
+        startup.defer("indexes", create_indexes)
+        startup.defer("bot stats", update_bot_stats, self.bot)
+        startup.defer("broadcast resume", resume_broadcast_jobs, self.bot)
+        
+        # Worker processes keep their own known-id indexes; this one only routes updates
+        if startup.pool is None:
+            startup.defer("known ids", warm_known_ids)
+        startup.report_when_done()
+        
+        # Growth history is snapshotted for as long as the bot runs
+        stats_recorder.start()
+
+    async def stop(self):
+        """Drain workers, handlers and broadcasts, flush buffered writes and disconnect"""
+        # Workers finish their queued updates while the client can still send for them
+        if self.startup.pool is not None:
+            await self.startup.pool.stop()
+        
+        # Updates still queued are handled now, so their tracking writes make the final flush
+        if self.bot.is_initialized:
+            await self.bot.dispatcher.stop()
+        
+        # Buffered welcomes go out while the client is still connected
+        if self.bot.is_connected:
+            await welcome_aggregator.stop(self.bot)
+        
+        # Checkpoint running broadcasts and write out buffered user/chat updates
+        await stats_recorder.stop()
+        await shutdown_broadcast_jobs()
+        await close_db()
+        
+        # Only a client that actually connected can be stopped
+        if self.bot.is_connected:
+            await self.bot.stop()
+
+    async def run(self):
+        """Start the bot, run until SIGINT/SIGTERM and shut down cleanly"""
+        try:
+            await self.start()
+            logger.info("Bot is now running...")
+            await idle()
+        except Exception as e:
+            logger.error(f"Error starting bot: {e}")
+            logger.info(f"Startup timings:\n{self.startup.format_timings()}")
+        finally:
+            await self.stop()
+
+def create_app(name, plugins, client_options=None):
+    """Build the application; call inside the running event loop (nothing here does network I/O)"""
+    init_db()
+    return App(name, plugins, client_options)
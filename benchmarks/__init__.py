@@ -0,0 +1 @@
+# Micro-benchmarks for db.py and handler hot paths (run with: python -m benchmarks.bench)
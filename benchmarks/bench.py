@@ -0,0 +1,209 @@
+"""
+Micro-benchmarks for db.py and the handler hot paths
+
+Usage:
+    python -m benchmarks.bench [-n 20000] [--storage sqlite] [--db-latency 0.5] [--save results.json] [--compare old.json]
+
+Everything runs against the in-memory or SQLite storage backend and a fake client, so no MongoDB
+server or Telegram connection is needed.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from benchmarks.fakes import install_storage, FakeClient, make_message, make_callback_query
+
+import db
+import handlers
+from throttle import throttle
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def _db_round_trips():
+    collections = (db.users_collection, db.chats_collection, db.bot_stats_collection, db.broadcast_jobs_collection)
+    return sum(collection.round_trips for collection in collections)
+
+async def measure(name, op, count, client=None, teardown=None):
+    """Await op(i) count times and report throughput and latency percentiles"""
+    round_trips = _db_round_trips()
+    api_calls = client.calls if client else 0
+    latencies = []
+    
+    start = time.perf_counter()
+    for i in range(count):
+        op_start = time.perf_counter()
+        await op(i)
+        latencies.append(time.perf_counter() - op_start)
+    
+    # Deferred work (e.g. flushing write buffers) counts towards the total
+    if teardown is not None:
+        await teardown()
+    total = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        "name": name,
+        "ops": count,
+        "seconds": round(total, 4),
+        "ops_per_sec": round(count / total, 1),
+        "p50_us": round(_percentile(latencies, 0.50) * 1e6, 2),
+        "p95_us": round(_percentile(latencies, 0.95) * 1e6, 2),
+        "p99_us": round(_percentile(latencies, 0.99) * 1e6, 2),
+        "db_round_trips": _db_round_trips() - round_trips,
+        "api_calls": (client.calls - api_calls) if client else 0
+    }
+
+async def bench_add_user(count, pool, setup):
+    await setup()
+
+    async def op(i):
+        user_id = i % pool
+        await db.add_user(user_id, f"user{user_id}", "Bench", None)
+    
+    return await measure("add_user", op, count, teardown=db.users_buffer.flush)
+
+async def bench_add_chat(count, pool, setup):
+    await setup()
+
+    async def op(i):
+        await db.add_chat(-100000 - i % pool, "Benchmark group", "supergroup")
+    
+    return await measure("add_chat", op, count, teardown=db.chats_buffer.flush)
+
+async def bench_counters(count, pool, setup):
+    await setup()
+    for user_id in range(pool):
+        await db.add_user(user_id, f"user{user_id}")
+    await db.users_buffer.flush()
+
+    async def op(i):
+        await db.get_users_count()
+    
+    return await measure("get_users_count", op, count)
+
+async def bench_iter_user_ids(count, pool, setup):
+    await setup()
+    for user_id in range(count):
+        db.users_buffer.add(user_id, {"user_id": user_id})
+    await db.users_buffer.flush()
+    
+    recipients = db.iter_user_ids()
+
+    async def op(i):
+        await recipients.__anext__()
+    
+    return await measure("iter_user_ids", op, count)
+
+async def bench_group_message(count, pool, setup):
+    await setup()
+    client = FakeClient()
+    messages = [make_message(client, chat_id=-100000 - i % 10, user_id=i) for i in range(pool)]
+
+    async def op(i):
+        await handlers.handle_group_message(client, messages[i % pool])
+
+    async def flush():
+        await db.users_buffer.flush()
+        await db.chats_buffer.flush()
+    
+    return await measure("handle_group_message", op, count, client, teardown=flush)
+
+async def bench_callback(count, pool, setup):
+    await setup()
+    client = FakeClient()
+    message = make_message(client)
+    
+    # Mostly re-taps of the page already shown, like real button mashing
+    pages = ["stats", "stats", "stats", "help", "help", "start"]
+    
+    # Measure the render path (throttle bookkeeping included), not throttled answers
+    throttle.user_limit = throttle.chat_limit = count
+
+    async def op(i):
+        await handlers.handle_callback_query(client, make_callback_query(client, pages[i % len(pages)], message))
+    
+    return await measure("handle_callback_query", op, count, client)
+
+BENCHMARKS = {
+    "add_user": bench_add_user,
+    "add_chat": bench_add_chat,
+    "counters": bench_counters,
+    "iter_user_ids": bench_iter_user_ids,
+    "group_message": bench_group_message,
+    "callback": bench_callback
+}
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_results(results, baseline=None):
+    """Print a results table, with the ops/s change against a baseline run if given"""
+    previous = {result["name"]: result for result in (baseline or {}).get("results", [])}
+    
+    print(f"{'benchmark':<24}{'ops/s':>12}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'db rt':>8}{'api':>8}{'change':>10}")
+    for result in results:
+        change = ""
+        if result["name"] in previous:
+            before = previous[result["name"]]["ops_per_sec"]
+            change = f"{(result['ops_per_sec'] - before) / before * 100:+.1f}%"
+        print(
+            f"{result['name']:<24}{result['ops_per_sec']:>12}{result['p50_us']:>10}{result['p95_us']:>10}"
+            f"{result['p99_us']:>10}{result['db_round_trips']:>8}{result['api_calls']:>8}{change:>10}"
+        )
+
+async def run(args):
+    results = []
+    for name in args.only or BENCHMARKS:
+        with tempfile.TemporaryDirectory() as directory:
+            # Every benchmark starts from an empty database
+            async def setup():
+                return await install_storage(args.storage, args.db_latency / 1000, os.path.join(directory, "bench.db"))
+            
+            results.append(await BENCHMARKS[name](args.count, args.pool, setup))
+            await db.close_db()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark db.py and handler hot paths")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="operations per benchmark")
+    parser.add_argument("--pool", type=int, default=1000, help="distinct users/chats in the workload")
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory", help="storage backend to run against")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="simulated MongoDB round-trip in ms")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "revision": _git_revision(),
+                "python": platform.python_version(),
+                "timestamp": time.time(),
+                "args": vars(args),
+                "results": results
+            }, f, indent=2)
+        print(f"Saved results to {args.save}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
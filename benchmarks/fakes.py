@@ -0,0 +1,110 @@
+"""
+Storage setup and an in-memory stand-in for the Pyrogram client used by the benchmarks
+"""
+import asyncio
+import inspect
+import itertools
+from functools import wraps
+from types import SimpleNamespace
+
+import db
+from storage import open_database
+
+class CountingCollection:
+    """Wrap a storage collection, counting (and optionally delaying) every database round trip"""
+
+    def __init__(self, collection, latency=0.0):
+        self.collection = collection
+        self.latency = latency
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @wraps(attr)
+        async def round_trip(*args, **kwargs):
+            self.round_trips += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return await attr(*args, **kwargs)
+        
+        return round_trip
+
+async def install_storage(backend="memory", latency=0.0, sqlite_path=None):
+    """Point db.py at a fresh storage backend, the way init_db does, and create its indexes"""
+    database = open_database(backend, sqlite_path)
+    db.db = database
+    db.users_collection = CountingCollection(database.users, latency)
+    db.chats_collection = CountingCollection(database.chats, latency)
+    db.bot_stats_collection = CountingCollection(database.bot_stats, latency)
+    db.broadcast_jobs_collection = CountingCollection(database.broadcast_jobs, latency)
+    db.stats_history_collection = CountingCollection(database.stats_history, latency)
+    db.users_buffer = db.WriteBuffer(db.users_collection, "user_id", counter="users_count", index=db.known_users)
+    db.chats_buffer = db.WriteBuffer(db.chats_collection, "chat_id", counter="chats_count", index=db.known_chats)
+    db.users_written.clear()
+    db.chats_written.clear()
+    db.known_users.clear()
+    db.known_chats.clear()
+    db.counters_cache.invalidate()
+    await db.create_indexes()
+    return database
+
+class FakeClient:
+    """Pyrogram client stand-in that records API calls instead of sending them"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.me = SimpleNamespace(id=1, username="LisaXBot")
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+
+    async def _api_call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._api_call()
+        return make_message(self, chat_id=chat_id, text=text)
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids, **kwargs):
+        await self._api_call()
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._api_call()
+
+def make_message(client, chat_id=-100123, chat_type="supergroup", user_id=42, text="hello"):
+    """Build a message object with the fields the handlers read"""
+    message = SimpleNamespace(
+        id=next(client._message_ids),
+        text=text,
+        caption=None,
+        chat=SimpleNamespace(id=chat_id, title="Benchmark group", type=chat_type),
+        from_user=SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="Bench", last_name=None),
+        reply_to_message=None
+    )
+
+    async def reply_text(text, **kwargs):
+        return await client.send_message(chat_id, text, **kwargs)
+    
+    message.reply_text = reply_text
+    return message
+
+def make_callback_query(client, data, message):
+    """Build a callback query for a button press on message"""
+    async def edit_message_text(text, **kwargs):
+        await client.edit_message_text(message.chat.id, message.id, text, **kwargs)
+
+    async def answer(text=None, **kwargs):
+        await client._api_call()
+    
+    return SimpleNamespace(
+        data=data,
+        from_user=message.from_user,
+        message=message,
+        inline_message_id=None,
+        edit_message_text=edit_message_text,
+        answer=answer
+    )
@@ -0,0 +1,484 @@
+"""
+Concurrent, rate-limited broadcast engine with resumable jobs
+"""
+import asyncio
+import logging
+from io import BytesIO
+from collections import deque
+from bson import ObjectId
+from bson.errors import InvalidId
+from pyrogram import raw
+from pyrogram.enums import ParseMode
+from pyrogram.types import Message
+from pyrogram.utils import get_input_media_from_file_id
+from pyrogram.errors import (
+    FloodWait, InternalServerError, RPCError,
+    UserIsBlocked, InputUserDeactivated, PeerIdInvalid, ChatIdInvalid, ChannelInvalid,
+    ChannelPrivate, ChatWriteForbidden, ChatForbidden
+)
+
+from db import (
+    ACTIVE_QUERY, iter_user_ids, iter_chat_ids, estimate_users_count, estimate_chats_count,
+    mark_user_inactive, mark_chat_inactive,
+    create_broadcast_job, get_broadcast_job, get_broadcast_jobs, update_broadcast_job
+)
+from ratelimit import TokenBucket
+from progress import ProgressReporter
+from outbound import outbound_priority, BULK
+from utils import get_readable_time
+from config import BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_RETRIES, BROADCAST_CHECKPOINT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Shared by every broadcast so concurrent runs stay within Telegram's global limit
+broadcast_bucket = TokenBucket(BROADCAST_RATE)
+
+# Errors worth retrying with backoff; anything else is a permanent failure
+TRANSIENT_ERRORS = (InternalServerError, OSError, asyncio.TimeoutError)
+
+# Permanent errors meaning a recipient can no longer be reached, and the reason stored for them
+UNREACHABLE_ERRORS = (
+    (UserIsBlocked, "blocked"),
+    (InputUserDeactivated, "deactivated"),
+    ((PeerIdInvalid, ChatIdInvalid, ChannelInvalid), "chat not found"),
+    ((ChannelPrivate, ChatWriteForbidden, ChatForbidden), "kicked")
+)
+
+# Recipient streams, size estimates and how to mark recipients unreachable per broadcast target
+RECIPIENTS = {"users": iter_user_ids, "chats": iter_chat_ids}
+ESTIMATES = {"users": estimate_users_count, "chats": estimate_chats_count}
+MARK_INACTIVE = {"users": mark_user_inactive, "chats": mark_chat_inactive}
+
+# Named recipient filters; jobs store the name since queries with operators cannot be stored as-is
+AUDIENCES = {"all": {}, "active": ACTIVE_QUERY}
+
+# Message attributes holding media that can be sent again by file id
+COPYABLE_MEDIA = ("photo", "video", "animation", "document", "audio", "voice", "video_note", "sticker")
+
+# Jobs running in this process: job id -> (task, stop event)
+running_jobs = {}
+
+class BroadcastStats:
+    """Progress counters and resume checkpoint for a running broadcast"""
+
+    def __init__(self, total, success=0, failed=0, last_id=None, unreachable=0):
+        self.total = total
+        self.success = success
+        self.failed = failed
+        self.unreachable = unreachable
+        self.last_id = last_id
+        self.start_time = asyncio.get_running_loop().time()
+        self._in_flight = deque()
+        self._completed = set()
+
+    @property
+    def done(self):
+        return self.success + self.failed
+
+    @property
+    def elapsed(self):
+        return asyncio.get_running_loop().time() - self.start_time
+
+    def dispatched(self, chat_id):
+        """Record that chat_id was handed to a worker (ids arrive in ascending order)"""
+        self._in_flight.append(chat_id)
+
+    def completed(self, chat_id):
+        """Record that chat_id was processed and advance the checkpoint"""
+        self._completed.add(chat_id)
+        
+        # The checkpoint only moves past ids whose predecessors are all finished
+        while self._in_flight and self._in_flight[0] in self._completed:
+            self.last_id = self._in_flight.popleft()
+            self._completed.discard(self.last_id)
+
+def classify_failure(error):
+    """Reason a send error means the recipient is unreachable, or None if it may succeed later"""
+    for errors, reason in UNREACHABLE_ERRORS:
+        if isinstance(error, errors):
+            return reason
+    return None
+
+async def deliver(send, chat_id, bucket=broadcast_bucket, retries=BROADCAST_RETRIES):
+    """Send to one recipient, retrying transient errors; returns None or why it failed"""
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            await send(chat_id)
+            return None
+        except FloodWait as e:
+            # Pause the shared bucket so every worker backs off, not just this one
+            logger.warning(f"FloodWait of {e.value}s during broadcast, pausing sends")
+            bucket.pause(e.value)
+        except TRANSIENT_ERRORS as e:
+            if attempt >= retries:
+                logger.debug(f"Giving up on {chat_id} after {attempt + 1} attempts: {e}")
+                return "error"
+            await asyncio.sleep(2 ** attempt)
+            attempt += 1
+        except RPCError as e:
+            logger.debug(f"Broadcast to {chat_id} failed: {e}")
+            return classify_failure(e) or "error"
+
+async def run_broadcast(recipients, send, stats, stop=None, workers=BROADCAST_WORKERS, bucket=broadcast_bucket, mark_inactive=None):
+    """Deliver to every id from an async iterable using a bounded pool of workers"""
+    queue = asyncio.Queue(maxsize=workers * 2)
+    unreachable_reasons = {reason for errors, reason in UNREACHABLE_ERRORS}
+
+    async def worker():
+        while True:
+            chat_id = await queue.get()
+            try:
+                reason = await deliver(send, chat_id, bucket)
+            except Exception as e:
+                logger.error(f"Unexpected error broadcasting to {chat_id}: {e}")
+                reason = "error"
+            
+            # Not reached on cancellation: the id stays in flight, so the checkpoint stays before it
+            if reason is None:
+                stats.success += 1
+            else:
+                stats.failed += 1
+            stats.completed(chat_id)
+            
+            # Recipients that can no longer be reached are skipped by later broadcasts
+            if reason in unreachable_reasons:
+                stats.unreachable += 1
+                if mark_inactive is not None:
+                    try:
+                        await mark_inactive(chat_id, reason)
+                    except Exception as e:
+                        logger.error(f"Could not mark {chat_id} as unreachable: {e}")
+            queue.task_done()
+    
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        async for chat_id in recipients:
+            # Stop feeding new recipients but let queued ones drain
+            if stop is not None and stop.is_set():
+                break
+            stats.dispatched(chat_id)
+            await queue.put(chat_id)
+        await queue.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    return stats
+
+def _capture_item(message):
+    """File id (if any) and HTML-formatted text or caption of one message"""
+    media = next((getattr(message, kind) for kind in COPYABLE_MEDIA if getattr(message, kind, None)), None)
+    text = message.caption or message.text
+    return {"file_id": media.file_id if media else None, "text": text.html if text else ""}
+
+async def capture_content(client, message):
+    """Capture a message once so recipients get a copy: no re-upload and no "Forwarded from" header"""
+    source = {"from_chat_id": message.chat.id, "message_id": message.id}
+    
+    # Albums are captured whole and sent as one group
+    if message.media_group_id:
+        album = await client.get_media_group(message.chat.id, message.id)
+        return {"type": "album", **source, "items": [_capture_item(item) for item in album]}
+    
+    # Polls, locations, contacts and the like have nothing to copy and are still forwarded
+    item = _capture_item(message)
+    if item["file_id"] is None and not item["text"]:
+        return {"type": "forward", **source}
+    
+    content = {"type": "copy", **source, **item}
+    if message.reply_markup:
+        # Stored as serialized TL so any keyboard type round-trips
+        content["reply_markup"] = (await message.reply_markup.write(client)).write()
+    return content
+
+async def _prepare_item(client, item):
+    """Raw media and parsed text of a captured item"""
+    parsed = await client.parser.parse(item["text"], ParseMode.HTML)
+    media = get_input_media_from_file_id(item["file_id"]) if item["file_id"] else None
+    return media, parsed["message"], parsed["entities"] or None
+
+async def make_sender(client, content):
+    """Build the per-recipient send coroutine for stored broadcast content"""
+    if content["type"] == "forward":
+        async def send(chat_id):
+            await client.forward_messages(chat_id, content["from_chat_id"], content["message_id"])
+        return send
+    if content["type"] == "text":
+        async def send(chat_id):
+            await client.send_message(chat_id, content["text"])
+        return send
+    
+    # Copies are prepared once per run, so each recipient costs a single raw API call
+    items = content["items"] if content["type"] == "album" else [content]
+    prepared = [await _prepare_item(client, item) for item in items]
+    reply_markup = raw.core.TLObject.read(BytesIO(content["reply_markup"])) if content.get("reply_markup") else None
+    
+    if content["type"] == "album":
+        async def send(chat_id):
+            await client.invoke(raw.functions.messages.SendMultiMedia(
+                peer=await client.resolve_peer(chat_id),
+                multi_media=[
+                    raw.types.InputSingleMedia(media=media, random_id=client.rnd_id(), message=text, entities=entities)
+                    for media, text, entities in prepared
+                ]
+            ))
+        return send
+    
+    media, text, entities = prepared[0]
+    if media is None:
+        async def send(chat_id):
+            await client.invoke(raw.functions.messages.SendMessage(
+                peer=await client.resolve_peer(chat_id),
+                message=text,
+                random_id=client.rnd_id(),
+                entities=entities,
+                reply_markup=reply_markup
+            ))
+    else:
+        async def send(chat_id):
+            await client.invoke(raw.functions.messages.SendMedia(
+                peer=await client.resolve_peer(chat_id),
+                media=media,
+                message=text,
+                random_id=client.rnd_id(),
+                entities=entities,
+                reply_markup=reply_markup
+            ))
+    return send
+
+async def _edit_status(client, job, text):
+    """Edit the job's status message, ignoring Telegram errors"""
+    try:
+        await client.edit_message_text(job["admin_chat_id"], job["status_message_id"], text)
+    except RPCError as e:
+        logger.debug(f"Could not update broadcast status: {e}")
+
+def _progress_text(job, stats, reporter):
+    """Format the in-progress status of a broadcast"""
+    total = stats.total
+    target = job["target"]
+    
+    # The total is an estimate, so clamp the percentage
+    progress = min(stats.done / total * 100, 100) if total else 0
+    
+    return (
+        f"Broadcasting message to {total} {target}...\n\n"
+        f"Progress: {progress:.1f}% ({stats.done}/{total})\n"
+        f"✅ Success: {stats.success}\n"
+        f"❌ Failed: {stats.failed}\n"
+        f"🚫 Unreachable: {stats.unreachable}\n"
+        f"⏱️ ETA: {reporter.eta_text()}\n"
+        f"🆔 Job: `{job['_id']}`"
+    )
+
+async def _save_checkpoint(job_id, stats):
+    """Persist the resume point and counters of a job"""
+    await update_broadcast_job(job_id, {
+        "last_id": stats.last_id,
+        "success": stats.success,
+        "failed": stats.failed,
+        "unreachable": stats.unreachable
+    })
+
+async def _run_job(client, job, stop):
+    """Run a broadcast job from its checkpoint until done or stopped"""
+    # Broadcast sends (and tasks started here) queue behind handler replies; this task has its own context
+    outbound_priority.set(BULK)
+    job_id = job["_id"]
+    stats = BroadcastStats(job.get("total", 0), job["success"], job["failed"], job["last_id"], job.get("unreachable", 0))
+    # Jobs created before named audiences stored the query itself
+    audience = job.get("audience")
+    query = AUDIENCES[audience] if isinstance(audience, str) else audience
+    recipients = RECIPIENTS[job["target"]](query=query, after=job["last_id"])
+    mark_inactive = MARK_INACTIVE[job["target"]]
+    
+    # Content that cannot be prepared would fail for every recipient
+    try:
+        send = await make_sender(client, job["content"])
+    except (ValueError, RPCError) as e:
+        logger.error(f"Broadcast job {job_id} content cannot be sent: {e}")
+        await update_broadcast_job(job_id, {"status": "failed"})
+        await _edit_status(client, job, f"❌ Broadcast failed: the message cannot be copied ({e})")
+        return
+    
+    # Status edits have their own small budget and hold off while sends are paused by a FloodWait
+    reporter = ProgressReporter(
+        client, job["admin_chat_id"], job["status_message_id"],
+        render=lambda reporter: _progress_text(job, stats, reporter),
+        progress=lambda: (stats.done, stats.total),
+        bucket=broadcast_bucket
+    )
+
+    async def checkpoint():
+        """Write the checkpoint periodically rather than per recipient"""
+        while True:
+            await asyncio.sleep(BROADCAST_CHECKPOINT_INTERVAL)
+            await _save_checkpoint(job_id, stats)
+            
+            # The job may have been paused or cancelled from another process
+            current = await get_broadcast_job(job_id)
+            if current is not None and current["status"] != "running":
+                stop.set()
+
+    def stopped_text():
+        """Final report of a job that was stopped or failed; sent without holding up shutdown"""
+        return f"{_progress_text(job, stats, reporter)}\n\n⏸️ Stopped, progress is saved"
+    
+    reporter.start()
+    background = asyncio.create_task(checkpoint())
+    try:
+        await run_broadcast(recipients, send, stats, stop, mark_inactive=mark_inactive)
+    except BaseException:
+        await reporter.finish(stopped_text(), max_wait=0)
+        raise
+    finally:
+        background.cancel()
+        # Persist progress whether the job finished, was stopped or failed
+        await _save_checkpoint(job_id, stats)
+    
+    # A stopped job keeps the status set by whoever stopped it
+    if stop.is_set():
+        await reporter.finish(stopped_text(), max_wait=0)
+        return
+    
+    await update_broadcast_job(job_id, {"status": "completed"})
+    
+    # Send final report
+    readable_time = get_readable_time(int(stats.elapsed))
+    await reporter.finish(
+        f"✅ Broadcast completed in {readable_time}\n\n"
+        f"Total {job['target']}: {stats.done}\n"
+        f"✅ Success: {stats.success}\n"
+        f"❌ Failed: {stats.failed}\n"
+        f"🚫 Unreachable (skipped from now on): {stats.unreachable}"
+    )
+
+def start_broadcast_job(client, job):
+    """Start running a job in the background"""
+    stop = asyncio.Event()
+    task = asyncio.create_task(_run_job(client, job, stop))
+    running_jobs[job["_id"]] = (task, stop)
+    task.add_done_callback(lambda _: running_jobs.pop(job["_id"], None))
+    return task
+
+async def stop_broadcast_job(job_id, timeout=30):
+    """Stop a running job after its in-flight sends finish"""
+    if job_id not in running_jobs:
+        return
+    
+    task, stop = running_jobs[job_id]
+    stop.set()
+    try:
+        await asyncio.wait_for(task, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Broadcast job {job_id} did not drain in {timeout}s, cancelled")
+    except Exception as e:
+        logger.error(f"Broadcast job {job_id} failed while stopping: {e}")
+
+async def resume_broadcast_jobs(client):
+    """Restart jobs that were running when the process last stopped"""
+    jobs = await get_broadcast_jobs(statuses=["running"], limit=100)
+    for job in jobs:
+        if job["_id"] not in running_jobs:
+            logger.info(f"Resuming broadcast job {job['_id']} after {job['last_id']}")
+            start_broadcast_job(client, job)
+    return len(jobs)
+
+async def shutdown_broadcast_jobs(timeout=10):
+    """Checkpoint running jobs on shutdown; they stay "running" and resume on start"""
+    await asyncio.gather(
+        *(stop_broadcast_job(job_id, timeout) for job_id in list(running_jobs)),
+        return_exceptions=True
+    )
+
+async def broadcast_command_handler(client, message: Message, target):
+    """Start /broadcast (target "users") or /chatbroadcast (target "chats") as a job"""
+    # Check if the message has text to broadcast
+    if len(message.command) < 2 and not message.reply_to_message:
+        await message.reply_text(
+            "Please provide text to broadcast or reply to a message.\n"
+            f"Usage: `/{message.command[0]} your message here`"
+        )
+        return
+    
+    # Replies are captured once as file ids and formatted text, then copied to every recipient
+    if message.reply_to_message:
+        content = await capture_content(client, message.reply_to_message)
+    else:
+        content = {"type": "text", "text": message.text.split(maxsplit=1)[1]}
+    
+    # The estimate is only used for progress display
+    total = await ESTIMATES[target]()
+    if total == 0:
+        await message.reply_text(f"No {target} found in database.")
+        return
+    
+    # Send the initial status message
+    status_msg = await message.reply_text(
+        f"Broadcasting message to {total} {target}..."
+    )
+    
+    job = {
+        "target": target,
+        "content": content,
+        # Recipients marked unreachable by earlier broadcasts are not tried again
+        "audience": "active",
+        "total": total,
+        "admin_chat_id": status_msg.chat.id,
+        "status_message_id": status_msg.id
+    }
+    job_id = await create_broadcast_job(job)
+    if job_id is None:
+        await status_msg.edit_text("❌ Could not create the broadcast job.")
+        return
+    
+    start_broadcast_job(client, await get_broadcast_job(job_id))
+
+async def broadcast_jobs_command_handler(client, message: Message):
+    """List broadcast jobs or pause/resume/cancel one: /broadcasts [action job_id]"""
+    # Without arguments, list the most recent jobs
+    if len(message.command) < 3:
+        jobs = await get_broadcast_jobs()
+        if not jobs:
+            await message.reply_text("No broadcast jobs found.")
+            return
+        
+        lines = ["📣 **Broadcast Jobs**\n"]
+        for job in jobs:
+            lines.append(
+                f"`{job['_id']}` - {job['status']} - {job['target']}: "
+                f"✅ {job['success']} ❌ {job['failed']}"
+            )
+        lines.append("\nUsage: `/broadcasts pause|resume|cancel job_id`")
+        await message.reply_text("\n".join(lines))
+        return
+    
+    action = message.command[1].lower()
+    try:
+        job_id = ObjectId(message.command[2])
+    except InvalidId:
+        await message.reply_text("Invalid job id.")
+        return
+    
+    job = await get_broadcast_job(job_id)
+    if job is None:
+        await message.reply_text("Broadcast job not found.")
+        return
+    
+    if action == "pause" and job["status"] == "running":
+        await update_broadcast_job(job_id, {"status": "paused"})
+        await stop_broadcast_job(job_id)
+        await message.reply_text(f"⏸️ Broadcast job `{job_id}` paused.")
+    elif action == "resume" and job["status"] == "paused":
+        await update_broadcast_job(job_id, {"status": "running"})
+        start_broadcast_job(client, await get_broadcast_job(job_id))
+        await message.reply_text(f"▶️ Broadcast job `{job_id}` resumed.")
+    elif action == "cancel" and job["status"] in ("running", "paused"):
+        await update_broadcast_job(job_id, {"status": "cancelled"})
+        await stop_broadcast_job(job_id)
+        await message.reply_text(f"🛑 Broadcast job `{job_id}` cancelled.")
+    else:
+        await message.reply_text(f"Cannot {action} a job that is {job['status']}.")
@@ -0,0 +1,78 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+class LRUCache:
+    """Bounded least-recently-used cache with a per-entry time to live"""
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        
+        # Mark as most recently used
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for key, evicting the least recently used entry if full"""
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove key from the cache and return its value"""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove all entries"""
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SingleFlightCache:
+    """Cache the result of an async loader for ttl seconds, sharing one refresh between callers"""
+
+    def __init__(self, loader, ttl=30):
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self._expires_at = 0
+        self._pending = None
+
+    async def get(self):
+        """Return the cached value, refreshing it at most once at a time when stale"""
+        if time.monotonic() < self._expires_at:
+            return self.value
+        
+        # Concurrent callers wait on the same refresh instead of starting their own
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._pending)
+
+    async def _refresh(self):
+        try:
+            self.value = await self.loader()
+            self._expires_at = time.monotonic() + self.ttl
+            return self.value
+        finally:
+            self._pending = None
+
+    def invalidate(self):
+        """Force the next get() to reload"""
+        self._expires_at = 0
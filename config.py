@@ -24,6 +24,81 @@ OWNER_USERNAME = os.environ.get("OWNER_USERNAME", "")
 # MongoDB
 MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
 
+# Storage backend: "mongo", "sqlite" (single file in WAL mode) or "memory" (lost on restart)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mongo").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "lisax.db")
+
+# Write buffering for user/chat tracking (flush after this many pending keys or seconds)
+WRITE_BUFFER_SIZE = int(os.environ.get("WRITE_BUFFER_SIZE", "500"))
+WRITE_BUFFER_INTERVAL = float(os.environ.get("WRITE_BUFFER_INTERVAL", "2"))
+
+# Skip tracking writes when nothing changed and last_seen is newer than this many seconds
+LAST_SEEN_GRANULARITY = int(os.environ.get("LAST_SEEN_GRANULARITY", "300"))
+TRACKING_CACHE_SIZE = int(os.environ.get("TRACKING_CACHE_SIZE", "100000"))
+TRACKING_CACHE_TTL = int(os.environ.get("TRACKING_CACHE_TTL", "3600"))
+
+# Ids read per cursor batch when loading the known user/chat id indexes at startup
+ID_INDEX_BATCH_SIZE = int(os.environ.get("ID_INDEX_BATCH_SIZE", "10000"))
+
+# How long /stats may serve user/chat counters from memory
+STATS_CACHE_TTL = int(os.environ.get("STATS_CACHE_TTL", "30"))
+
+# Group administrator lists are cached per chat; failed lookups are retried sooner
+ADMIN_CACHE_TTL = int(os.environ.get("ADMIN_CACHE_TTL", "600"))
+ADMIN_CACHE_ERROR_TTL = int(os.environ.get("ADMIN_CACHE_ERROR_TTL", "60"))
+ADMIN_CACHE_SIZE = int(os.environ.get("ADMIN_CACHE_SIZE", "10000"))
+
+# Stats history: a snapshot every interval, rolled up per hour and per day; daily points are kept forever
+STATS_SNAPSHOT_INTERVAL = int(os.environ.get("STATS_SNAPSHOT_INTERVAL", "300"))
+STATS_RAW_RETENTION_DAYS = int(os.environ.get("STATS_RAW_RETENTION_DAYS", "7"))
+STATS_HOURLY_RETENTION_DAYS = int(os.environ.get("STATS_HOURLY_RETENTION_DAYS", "90"))
+
+# Broadcasts (Telegram allows bots roughly 30 messages per second overall)
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "25"))
+BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", "20"))
+BROADCAST_RETRIES = int(os.environ.get("BROADCAST_RETRIES", "3"))
+RECIPIENT_BATCH_SIZE = int(os.environ.get("RECIPIENT_BATCH_SIZE", "1000"))
+BROADCAST_CHECKPOINT_INTERVAL = float(os.environ.get("BROADCAST_CHECKPOINT_INTERVAL", "5"))
+
+# Outbound sends and edits: global messages per second, per private chat per second and per group per
+# minute (with bursts), and the longest a handler reply waits for its turn or a FloodWait before it is dropped
+OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_PRIVATE_RATE = float(os.environ.get("OUTBOUND_PRIVATE_RATE", "1"))
+OUTBOUND_PRIVATE_BURST = int(os.environ.get("OUTBOUND_PRIVATE_BURST", "3"))
+OUTBOUND_GROUP_RATE = float(os.environ.get("OUTBOUND_GROUP_RATE", "20"))
+OUTBOUND_GROUP_BURST = int(os.environ.get("OUTBOUND_GROUP_BURST", "5"))
+OUTBOUND_MAX_REPLY_WAIT = float(os.environ.get("OUTBOUND_MAX_REPLY_WAIT", "5"))
+OUTBOUND_CHAT_BUCKETS = int(os.environ.get("OUTBOUND_CHAT_BUCKETS", "10000"))
+
+# Progress messages are edited every 3-30 s depending on job speed; ETA uses a rate smoothed with this weight
+PROGRESS_MIN_INTERVAL = float(os.environ.get("PROGRESS_MIN_INTERVAL", "3"))
+PROGRESS_MAX_INTERVAL = float(os.environ.get("PROGRESS_MAX_INTERVAL", "30"))
+PROGRESS_SMOOTHING = float(os.environ.get("PROGRESS_SMOOTHING", "0.3"))
+
+# Joins are welcomed together after this many seconds, at most once per chat per cooldown, naming up to this many
+WELCOME_WINDOW = float(os.environ.get("WELCOME_WINDOW", "5"))
+WELCOME_COOLDOWN = float(os.environ.get("WELCOME_COOLDOWN", "60"))
+WELCOME_MAX_NAMES = int(os.environ.get("WELCOME_MAX_NAMES", "10"))
+
+# Commands and button presses allowed per user and per group chat in any THROTTLE_WINDOW seconds
+# (by default a group gets about as many as its outbound bucket can answer in the window)
+THROTTLE_WINDOW = float(os.environ.get("THROTTLE_WINDOW", "10"))
+THROTTLE_USER_LIMIT = int(os.environ.get("THROTTLE_USER_LIMIT", "8"))
+THROTTLE_CHAT_LIMIT = int(os.environ.get(
+    "THROTTLE_CHAT_LIMIT", str(int(OUTBOUND_GROUP_BURST + OUTBOUND_GROUP_RATE / 60 * THROTTLE_WINDOW))
+))
+THROTTLE_TRACKED_KEYS = int(os.environ.get("THROTTLE_TRACKED_KEYS", "50000"))
+
+# Queued updates before the oldest are dropped: commands/buttons, and background tracking
+DISPATCH_INTERACTIVE_LIMIT = int(os.environ.get("DISPATCH_INTERACTIVE_LIMIT", "1000"))
+DISPATCH_BACKGROUND_LIMIT = int(os.environ.get("DISPATCH_BACKGROUND_LIMIT", "5000"))
+
+# Worker processes handling updates, partitioned by chat id (0 handles them in the main process)
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0"))
+
+# Local Prometheus metrics endpoint (0 disables it)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
 # Messages
 WELCOME_MESSAGE = """
 👋 Welcome to LisaX Bot!
@@ -46,7 +121,10 @@ HELP_MESSAGE = """
 **Admin Commands:**
 /broadcast - Broadcast a message to all users
 /chatbroadcast - Broadcast a message to all chats
+/broadcasts - List, pause, resume or cancel broadcast jobs
 /adminstats - Show detailed bot statistics
+/growth - Show user, chat and activity growth (e.g. /growth 7d)
+/metrics - Show handler, database and API latency
 
 Made with ❤️ by @{}
 """.format(OWNER_USERNAME)
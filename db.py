@@ -1,8 +1,21 @@
-import os
 import time
+import asyncio
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
+from bson.errors import InvalidDocument
+from pymongo import UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+from config import (
+    MONGODB_URI, STORAGE_BACKEND, SQLITE_PATH,
+    WRITE_BUFFER_SIZE, WRITE_BUFFER_INTERVAL,
+    LAST_SEEN_GRANULARITY, TRACKING_CACHE_SIZE, TRACKING_CACHE_TTL,
+    RECIPIENT_BATCH_SIZE, STATS_CACHE_TTL, ID_INDEX_BATCH_SIZE,
+    STATS_SNAPSHOT_INTERVAL, STATS_RAW_RETENTION_DAYS, STATS_HOURLY_RETENTION_DAYS
+)
+from cache import LRUCache, SingleFlightCache
+from idindex import IdIndex
+from storage import Database, open_database
+from metrics import instrument_module, register_gauge
 
 logger = logging.getLogger(__name__)
 
@@ -12,99 +25,400 @@ db = None
 users_collection = None
 chats_collection = None
 bot_stats_collection = None
+broadcast_jobs_collection = None
+stats_history_collection = None
+
+# Write-behind buffers for tracking upserts
+users_buffer = None
+chats_buffer = None
+
+# Last written profile per user/chat id, used to skip redundant tracking writes
+users_written = LRUCache(maxsize=TRACKING_CACHE_SIZE, ttl=TRACKING_CACHE_TTL)
+chats_written = LRUCache(maxsize=TRACKING_CACHE_SIZE, ttl=TRACKING_CACHE_TTL)
+
+# Every user/chat id in the database, warmed at startup and updated by the write buffers
+known_users = IdIndex("users")
+known_chats = IdIndex("chats")
+
+def _needs_write(cache, key, fingerprint, now):
+    """Check whether a profile changed or its timestamp is older than the granularity"""
+    cached = cache.get(key)
+    if cached is not None:
+        cached_fingerprint, written_at = cached
+        if cached_fingerprint == fingerprint and now - written_at < LAST_SEEN_GRANULARITY:
+            return False
+    
+    cache.set(key, (fingerprint, now))
+    return True
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Track how many pooled MongoDB connections are open and checked out"""
+
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_checked_out(self, event):
+        self.in_use += 1
+
+    def connection_checked_in(self, event):
+        self.in_use -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+pool_monitor = PoolMonitor()
+
+# Document in bot_stats holding the maintained user/chat counters
+COUNTERS_ID = "counters"
+
+# Recipients not marked unreachable (documents written before the flag existed have no active field)
+ACTIVE_QUERY = {"active": {"$in": [True, None]}}
+
+# Stats history levels: (name, seconds per point, seconds per bucket document, retention in seconds or 0)
+STATS_LEVELS = (
+    ("raw", STATS_SNAPSHOT_INTERVAL, 86400, STATS_RAW_RETENTION_DAYS * 86400),
+    ("hour", 3600, 14 * 86400, STATS_HOURLY_RETENTION_DAYS * 86400),
+    ("day", 86400, 364 * 86400, 0)
+)
+
+class WriteBuffer:
+    """Coalesce upserts by key in memory and flush them as one bulk write"""
+
+    def __init__(self, collection, key, counter=None, index=None, max_size=WRITE_BUFFER_SIZE, interval=WRITE_BUFFER_INTERVAL):
+        self.collection = collection
+        self.key = key
+        self.counter = counter
+        self.index = index
+        self.max_size = max_size
+        self.interval = interval
+        self.pending = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher = None
+        self._closing = False
+
+    def add(self, key_value, data):
+        """Queue a $set upsert for key_value, merging with any pending one"""
+        pending = self.pending.get(key_value)
+        if pending is None:
+            self.pending[key_value] = dict(data)
+        else:
+            pending.update(data)
+        
+        # Start the background flusher on first use (needs a running loop)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+        
+        # Wake the flusher early when the size threshold is reached
+        if len(self.pending) >= self.max_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        """Flush pending writes every interval or when the buffer fills up"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all pending upserts in a single unordered bulk_write"""
+        async with self._lock:
+            if not self.pending:
+                return 0
+            
+            batch, self.pending = self.pending, {}
+            operations = [
+                UpdateOne({self.key: key_value}, {"$set": data}, upsert=True)
+                for key_value, data in batch.items()
+            ]
+            
+            keys = list(batch)
+            try:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                inserted = result.upserted_count
+                upserted = result.upserted_ids.keys()
+            except BulkWriteError as e:
+                # Per-document errors will not succeed on retry, so drop the failed ones
+                logger.error(f"Error flushing {len(operations)} writes to {self.collection.name}: {e}")
+                inserted = e.details.get("nUpserted", 0)
+                upserted = [upsert["index"] for upsert in e.details.get("upserted", [])]
+            except InvalidDocument as e:
+                logger.error(f"Error flushing {len(operations)} writes to {self.collection.name}: {e}")
+                return 0
+            except Exception as e:
+                logger.error(f"Error flushing {len(operations)} writes to {self.collection.name}: {e}")
+                # Upserts are idempotent, so requeue the batch without clobbering newer data
+                for key_value, data in batch.items():
+                    data.update(self.pending.get(key_value, {}))
+                    self.pending[key_value] = data
+                return 0
+            
+            # Newly inserted ids become known without another lookup
+            if self.index is not None:
+                for position in upserted:
+                    self.index.add(keys[position])
+            
+            # Only genuine first inserts move the maintained counter
+            if self.counter and inserted:
+                await increment_counter(self.counter, inserted)
+            
+            return len(operations)
+
+    async def close(self):
+        """Stop the background flusher and write out anything still pending"""
+        # Ask the flusher to exit rather than cancelling it: wait_for can swallow a
+        # cancellation that races with the wakeup event, leaving the task running
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+            self._closing = False
+        await self.flush()
 
 def init_db():
     """Initialize database connection and collections"""
-    global client, db, users_collection, chats_collection, bot_stats_collection
-    
-    # Get MongoDB connection string from environment variable or use default
-    mongodb_uri = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+    global client, db, users_collection, chats_collection, bot_stats_collection, broadcast_jobs_collection
+    global stats_history_collection
+    global users_buffer, chats_buffer
     
     try:
-        # Connect to MongoDB
-        client = AsyncIOMotorClient(mongodb_uri, serverSelectionTimeoutMS=5000)
-        
-        # Ping the server to confirm connection
-        client.admin.command('ping')
-        
-        logger.info("Connected to MongoDB")
-        
-        # Get database
-        db = client.lisax
+        if STORAGE_BACKEND == "mongo":
+            # Create the MongoDB client; it connects lazily, so check it with ping_db()
+            client = AsyncIOMotorClient(MONGODB_URI, serverSelectionTimeoutMS=5000, event_listeners=[pool_monitor])
+            
+            # Get database
+            db = client.lisax
+        else:
+            # Local storage with the same collection interface, no MongoDB server needed
+            db = open_database(STORAGE_BACKEND, SQLITE_PATH)
+            logger.info(f"Using {STORAGE_BACKEND} storage")
         
         # Get collections
         users_collection = db.users
         chats_collection = db.chats
         bot_stats_collection = db.bot_stats
+        broadcast_jobs_collection = db.broadcast_jobs
+        stats_history_collection = db.stats_history
+        
+        # Buffer tracking writes so handlers never wait on MongoDB
+        users_buffer = WriteBuffer(users_collection, "user_id", counter="users_count", index=known_users)
+        chats_buffer = WriteBuffer(chats_collection, "chat_id", counter="chats_count", index=known_chats)
+        
+        # Expose buffer, index and pool usage on /adminstats
+        register_gauge("Pending user writes", lambda: len(users_buffer.pending))
+        register_gauge("Pending chat writes", lambda: len(chats_buffer.pending))
+        register_gauge(
+            "Known ids (users / chats)",
+            lambda: f"{len(known_users):,} / {len(known_chats):,} ({(known_users.nbytes + known_chats.nbytes) / 1024 / 1024:.1f} MB)"
+        )
+        if client is not None:
+            max_pool_size = client.options.pool_options.max_pool_size
+            register_gauge("Mongo pool (in use / open / max)", lambda: f"{pool_monitor.in_use} / {pool_monitor.open} / {max_pool_size}")
         
         # Return true if successful
         return True
-        
+    
+    except Exception as e:
+        logger.error(f"Error opening {STORAGE_BACKEND} database: {e}")
+        return False
+
+async def ping_db():
+    """Check that the database answers a round trip"""
+    try:
+        if client is not None:
+            await client.admin.command("ping")
+            logger.info("Connected to MongoDB")
+        else:
+            await bot_stats_collection.find_one({"_id": COUNTERS_ID})
+        return True
     except ServerSelectionTimeoutError:
         logger.error("Could not connect to MongoDB server. Please check your connection string and ensure MongoDB is running.")
         return False
     except Exception as e:
-        logger.error(f"Error connecting to MongoDB: {e}")
+        logger.error(f"Database health check failed: {e}")
         return False
 
+async def close_db():
+    """Flush buffered writes before shutdown"""
+    for buffer in (users_buffer, chats_buffer):
+        if buffer is not None:
+            await buffer.close()
+    
+    # Local backends hold a file handle and worker thread
+    if isinstance(db, Database):
+        await db.close()
+
 async def create_indexes():
     """Create indexes for collections"""
     # Indexes for users collection
     await users_collection.create_index("user_id", unique=True)
     await users_collection.create_index("username")
+    await users_collection.create_index([("active", 1), ("user_id", 1)])
     
     # Indexes for chats collection
     await chats_collection.create_index("chat_id", unique=True)
+    await chats_collection.create_index([("active", 1), ("chat_id", 1)])
+    
+    # Indexes for broadcast jobs collection
+    await broadcast_jobs_collection.create_index("status")
+    
+    # Index for reading stats history buckets by level and time range
+    await stats_history_collection.create_index([("level", 1), ("start", 1)])
     
     logger.info("Database indexes created")
 
-async def add_user(user_id, username=None, first_name=None, last_name=None):
-    """Add or update a user in the database"""
+async def add_user(user_id, username=None, first_name=None, last_name=None, active=None):
+    """Add or update a user in the database (active=True when the user can be messaged again)"""
     try:
+        # Nothing to do if the profile is unchanged and was written recently
+        now = time.time()
+        
+        # The fingerprint includes the active flag; a write that leaves it unset keeps the last one written
+        written_active = active
+        if active is None:
+            cached = users_written.get(user_id)
+            written_active = cached[0][3] if cached is not None else None
+        if not _needs_write(users_written, user_id, (username, first_name, last_name, written_active), now):
+            return True
+        
         # Prepare user data
         user_data = {
             "user_id": user_id,
             "username": username,
             "first_name": first_name,
             "last_name": last_name,
-            "last_seen": time.time()
+            "last_seen": now
         }
+        if active is not None:
+            user_data["active"] = active
         
-        # Update user data or insert if not exists
-        await users_collection.update_one(
-            {"user_id": user_id},
-            {"$set": user_data},
-            upsert=True
-        )
+        # Queue the upsert; it is written in bulk by the users buffer
+        users_buffer.add(user_id, user_data)
         
         return True
     except Exception as e:
+        users_written.pop(user_id)
         logger.error(f"Error adding user {user_id} to database: {e}")
         return False
 
 async def add_chat(chat_id, title=None, chat_type=None):
     """Add or update a chat in the database"""
     try:
+        chat_type = getattr(chat_type, "value", chat_type)
+        
+        # Nothing to do if the chat is unchanged and was written recently
+        now = time.time()
+        if not _needs_write(chats_written, chat_id, (title, chat_type), now):
+            return True
+        
         # Prepare chat data
         chat_data = {
             "chat_id": chat_id,
             "title": title,
             "chat_type": chat_type,
-            "last_interaction": time.time()
+            "last_interaction": now,
+            # Updates only arrive from chats the bot is still in
+            "active": True
         }
         
-        # Update chat data or insert if not exists
-        await chats_collection.update_one(
-            {"chat_id": chat_id},
-            {"$set": chat_data},
-            upsert=True
-        )
+        # Queue the upsert; it is written in bulk by the chats buffer
+        chats_buffer.add(chat_id, chat_data)
         
         return True
     except Exception as e:
+        chats_written.pop(chat_id)
         logger.error(f"Error adding chat {chat_id} to database: {e}")
         return False
 
+def _is_known(index, key_value):
+    """True if the id is in the database, False only if an exact index rules it out, else None"""
+    # Ids are only added once written, so a hit is always right; a miss is only conclusive when
+    # this process sees every insert (worker processes do not)
+    if key_value in index:
+        return True
+    return False if index.exact else None
+
+def is_known_user(user_id):
+    """Whether the user is in the database without querying it (None when the index cannot tell)"""
+    return _is_known(known_users, user_id)
+
+def is_known_chat(chat_id):
+    """Whether the chat is in the database without querying it (None when the index cannot tell)"""
+    return _is_known(known_chats, chat_id)
+
+def _mark_inactive(buffer, written, key_value, reason, known):
+    """Queue marking a recipient unreachable; the next tracking write for it is not skipped"""
+    written.pop(key_value)
+    
+    # An id with no document and no pending first write has nothing to mark, and upserting would create one
+    if known is False and key_value not in buffer.pending:
+        return
+    buffer.add(key_value, {
+        buffer.key: key_value,
+        "active": False,
+        "inactive_reason": reason,
+        "inactive_since": time.time()
+    })
+
+async def mark_user_inactive(user_id, reason):
+    """Exclude a user from broadcasts until they message the bot again"""
+    try:
+        _mark_inactive(users_buffer, users_written, user_id, reason, is_known_user(user_id))
+        return True
+    except Exception as e:
+        logger.error(f"Error marking user {user_id} inactive: {e}")
+        return False
+
+async def mark_chat_inactive(chat_id, reason):
+    """Exclude a chat from broadcasts until the bot is back in it"""
+    try:
+        _mark_inactive(chats_buffer, chats_written, chat_id, reason, is_known_chat(chat_id))
+        return True
+    except Exception as e:
+        logger.error(f"Error marking chat {chat_id} inactive: {e}")
+        return False
+
+async def warm_known_ids(exact=True):
+    """Load every user and chat id into the known-id indexes (exact when no other process inserts)"""
+    for index, collection, key in ((known_users, users_collection, "user_id"), (known_chats, chats_collection, "chat_id")):
+        try:
+            # Only the id field is streamed, in index order, a cursor batch at a time
+            cursor = collection.find({}, {"_id": 0, key: 1}, batch_size=ID_INDEX_BATCH_SIZE).sort(key, 1)
+            await index.warm((doc[key] async for doc in cursor), exact=exact)
+        except Exception as e:
+            logger.error(f"Error warming known {index.name} index: {e}")
+            return False
+    return True
+
 async def get_user(user_id):
     """Get user data from the database"""
     try:
@@ -137,27 +451,118 @@ async def get_all_chats():
         logger.error(f"Error getting chats from database: {e}")
         return []
 
-async def get_users_count():
-    """Get the count of users"""
+async def _iter_ids(collection, key, query, after, batch_size):
+    """Stream a single id field in ascending order, one cursor batch at a time"""
+    try:
+        # Resume strictly after the last processed id when given
+        query = dict(query or {})
+        if after is not None:
+            query[key] = {"$gt": after}
+        
+        cursor = collection.find(query, {"_id": 0, key: 1}, batch_size=batch_size).sort(key, 1)
+        async for doc in cursor:
+            yield doc[key]
+    except Exception as e:
+        logger.error(f"Error streaming {key} values from database: {e}")
+
+def iter_user_ids(query=None, after=None, batch_size=RECIPIENT_BATCH_SIZE):
+    """Stream user ids (optionally after a checkpoint) without loading full documents"""
+    return _iter_ids(users_collection, "user_id", query, after, batch_size)
+
+def iter_chat_ids(query=None, after=None, batch_size=RECIPIENT_BATCH_SIZE):
+    """Stream chat ids (optionally after a checkpoint) without loading full documents"""
+    return _iter_ids(chats_collection, "chat_id", query, after, batch_size)
+
+async def estimate_users_count():
+    """Get a cheap estimate of the number of users broadcasts can reach"""
     try:
-        return await users_collection.count_documents({})
+        # Inactive users are few and counted from the (active, user_id) index
+        return await users_collection.estimated_document_count() - await users_collection.count_documents({"active": False})
     except Exception as e:
-        logger.error(f"Error getting users count: {e}")
+        logger.error(f"Error estimating users count: {e}")
         return 0
 
-async def get_chats_count():
-    """Get the count of chats"""
+async def estimate_chats_count():
+    """Get a cheap estimate of the number of chats broadcasts can reach"""
     try:
-        return await chats_collection.count_documents({})
+        return await chats_collection.estimated_document_count() - await chats_collection.count_documents({"active": False})
     except Exception as e:
-        logger.error(f"Error getting chats count: {e}")
+        logger.error(f"Error estimating chats count: {e}")
         return 0
 
+async def init_counters():
+    """Seed the maintained counters with a full count if they were never seeded"""
+    try:
+        counters = await bot_stats_collection.find_one({"_id": COUNTERS_ID})
+        if counters and counters.get("seeded"):
+            return True
+        
+        # One-off scan; from here on counters only move on genuine inserts
+        await bot_stats_collection.update_one(
+            {"_id": COUNTERS_ID},
+            {"$set": {
+                "users_count": await users_collection.count_documents({}),
+                "chats_count": await chats_collection.count_documents({}),
+                "seeded": True
+            }},
+            upsert=True
+        )
+        counters_cache.invalidate()
+        
+        logger.info("User/chat counters seeded")
+        return True
+    except Exception as e:
+        logger.error(f"Error seeding counters: {e}")
+        return False
+
+async def increment_counter(field, amount):
+    """Add newly inserted documents to a maintained counter"""
+    try:
+        await bot_stats_collection.update_one(
+            {"_id": COUNTERS_ID},
+            {"$inc": {field: amount}},
+            upsert=True
+        )
+        
+        # Keep the cached copy current instead of waiting for the TTL
+        if counters_cache.value is not None:
+            counters_cache.value[field] = counters_cache.value.get(field, 0) + amount
+        return True
+    except Exception as e:
+        logger.error(f"Error incrementing {field}: {e}")
+        return False
+
+async def _load_counters():
+    """Read the maintained counters document"""
+    try:
+        return await bot_stats_collection.find_one({"_id": COUNTERS_ID}) or {}
+    except Exception as e:
+        logger.error(f"Error getting counters: {e}")
+        return {}
+
+# Counters served from memory; concurrent refreshes share a single query
+counters_cache = SingleFlightCache(_load_counters, ttl=STATS_CACHE_TTL)
+
+async def get_users_count():
+    """Get the count of users"""
+    # The known-id index is an exact count when this process sees every insert
+    if known_users.exact:
+        return len(known_users)
+    counters = await counters_cache.get()
+    return counters.get("users_count", 0)
+
+async def get_chats_count():
+    """Get the count of chats"""
+    if known_chats.exact:
+        return len(known_chats)
+    counters = await counters_cache.get()
+    return counters.get("chats_count", 0)
+
 async def update_bot_stats(bot):
     """Update bot statistics in the database"""
     try:
-        # Get bot info
-        bot_info = await bot.get_me()
+        # Get bot info (cached by the client at startup)
+        bot_info = bot.me or await bot.get_me()
         
         # Get database statistics
         users_count = await get_users_count()
@@ -185,6 +590,114 @@ async def update_bot_stats(bot):
         logger.error(f"Error updating bot stats: {e}")
         return False
 
+async def record_stats_sample(timestamp, users_count, chats_count, updates):
+    """Add a snapshot to every level of the stats history"""
+    try:
+        # Each level keeps the latest counts per point and sums activity, so rollups need no rescan
+        operations = []
+        for level, step, span, retention in STATS_LEVELS:
+            point = int(timestamp // step * step)
+            start = int(timestamp // span * span)
+            operations.append(UpdateOne(
+                {"_id": f"{level}:{start}"},
+                {
+                    "$setOnInsert": {"level": level, "start": start},
+                    "$set": {f"points.{point}.users": users_count, f"points.{point}.chats": chats_count},
+                    "$inc": {f"points.{point}.updates": updates}
+                },
+                upsert=True
+            ))
+        
+        await stats_history_collection.bulk_write(operations, ordered=False)
+        return True
+    except Exception as e:
+        logger.error(f"Error recording stats sample: {e}")
+        return False
+
+async def prune_stats_history(now=None):
+    """Delete buckets past their level's retention; coarser levels still hold their data"""
+    try:
+        now = now or time.time()
+        deleted = 0
+        for level, step, span, retention in STATS_LEVELS:
+            if not retention:
+                continue
+            # Only buckets whose whole span is past the retention go
+            result = await stats_history_collection.delete_many({"level": level, "start": {"$lt": now - retention - span}})
+            deleted += result.deleted_count
+        
+        if deleted:
+            logger.info(f"Pruned {deleted} stats history buckets")
+        return deleted
+    except Exception as e:
+        logger.error(f"Error pruning stats history: {e}")
+        return 0
+
+async def get_stats_history(level, since, until=None):
+    """Get (timestamp, point) pairs of one stats history level between since and until"""
+    try:
+        until = until or time.time()
+        span = next(span for name, step, span, retention in STATS_LEVELS if name == level)
+        query = {"level": level, "start": {"$gte": int(since // span * span), "$lte": until}}
+        
+        points = []
+        async for bucket in stats_history_collection.find(query).sort("start", 1):
+            for point, values in sorted(bucket.get("points", {}).items(), key=lambda item: int(item[0])):
+                if since <= int(point) <= until:
+                    points.append((int(point), values))
+        return points
+    except Exception as e:
+        logger.error(f"Error getting stats history: {e}")
+        return []
+
+async def create_broadcast_job(job_data):
+    """Insert a new broadcast job and return its id"""
+    try:
+        now = time.time()
+        job_data = {
+            "status": "running",
+            "last_id": None,
+            "success": 0,
+            "failed": 0,
+            "unreachable": 0,
+            "created_at": now,
+            "updated_at": now,
+            **job_data
+        }
+        result = await broadcast_jobs_collection.insert_one(job_data)
+        return result.inserted_id
+    except Exception as e:
+        logger.error(f"Error creating broadcast job: {e}")
+        return None
+
+async def get_broadcast_job(job_id):
+    """Get a broadcast job by id"""
+    try:
+        return await broadcast_jobs_collection.find_one({"_id": job_id})
+    except Exception as e:
+        logger.error(f"Error getting broadcast job {job_id}: {e}")
+        return None
+
+async def get_broadcast_jobs(statuses=None, limit=10):
+    """Get the most recent broadcast jobs, optionally filtered by status"""
+    try:
+        query = {"status": {"$in": list(statuses)}} if statuses else {}
+        cursor = broadcast_jobs_collection.find(query).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    except Exception as e:
+        logger.error(f"Error getting broadcast jobs: {e}")
+        return []
+
+async def update_broadcast_job(job_id, job_data):
+    """Update fields of a broadcast job (checkpoint, counters or status)"""
+    try:
+        job_data = {**job_data, "updated_at": time.time()}
+        await broadcast_jobs_collection.update_one({"_id": job_id}, {"$set": job_data})
+        return True
+    except Exception as e:
+        logger.error(f"Error updating broadcast job {job_id}: {e}")
+        return False
+
 def get_db_stats():
     """Get database statistics for the web interface"""
     try:
@@ -194,7 +707,7 @@ def get_db_stats():
                 "users_count": 0,
                 "chats_count": 0
             }
-            
+        
         return {
             "status": "connected",
             "users_count": 0,  # Will be updated asynchronously
@@ -206,3 +719,6 @@ def get_db_stats():
             "status": "error",
             "error": str(e)
         }
+
+# Record call counts and latency of every database coroutine above
+instrument_module(globals(), "db")
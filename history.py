@@ -0,0 +1,164 @@
+"""
+Stats history: periodic snapshots of the user/chat counters and update activity, stored as
+bucketed time series by db.py, and the /growth report rendered from the rollups
+"""
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime
+from pyrogram.types import Message
+
+from db import (
+    STATS_LEVELS, get_users_count, get_chats_count,
+    record_stats_sample, prune_stats_history, get_stats_history
+)
+from metrics import get_counter
+from config import STATS_SNAPSHOT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# /growth ranges: a number and a unit, e.g. 24h, 7d, 4w, 6m, 1y
+RANGE_PATTERN = re.compile(r"^(\d+)([hdwmy])$")
+RANGE_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+DEFAULT_RANGE = "7d"
+
+# A level is only read when the range needs at most this many of its points
+MAX_POINTS = 500
+
+# Rows in the /growth table and columns in its sparkline
+REPORT_ROWS = 7
+SPARK_WIDTH = 24
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Expired buckets are looked for at most this often
+PRUNE_INTERVAL = 3600
+
+class StatsRecorder:
+    """Background scheduler writing a stats snapshot every interval"""
+
+    def __init__(self, interval=STATS_SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self.last_updates = 0
+        self.last_pruned = 0
+        self._task = None
+
+    async def snapshot(self):
+        """Record the current counters and the updates handled since the previous snapshot"""
+        now = time.time()
+        updates = get_counter("updates").value
+        recorded = await record_stats_sample(now, await get_users_count(), await get_chats_count(), updates - self.last_updates)
+        if recorded:
+            self.last_updates = updates
+        
+        # Downsampling is only dropping expired fine buckets, the rollups were written with them
+        if now - self.last_pruned >= PRUNE_INTERVAL:
+            await prune_stats_history(now)
+            self.last_pruned = now
+        return recorded
+
+    async def _run(self):
+        while True:
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Error taking stats snapshot: {e}")
+            # Wake on interval boundaries so each raw point gets one snapshot
+            await asyncio.sleep(self.interval - time.time() % self.interval)
+
+    def start(self):
+        """Start taking snapshots in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop taking snapshots"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+stats_recorder = StatsRecorder()
+
+def parse_range(text):
+    """Seconds in a range like 7d, or None if it is not one"""
+    match = RANGE_PATTERN.match(text.lower())
+    if not match or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * RANGE_UNITS[match.group(2)]
+
+def choose_level(seconds):
+    """Finest history level that still covers the range with a readable number of points"""
+    for level, step, span, retention in STATS_LEVELS:
+        if (not retention or seconds <= retention) and seconds / step <= MAX_POINTS:
+            return level
+    return STATS_LEVELS[-1][0]
+
+def sparkline(values):
+    """Render values as a row of block characters"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[int((value - low) / (high - low) * (len(SPARK_CHARS) - 1))] for value in values)
+
+def _columns(points, since, until, count):
+    """Split points into count equal time slices (empty slices are skipped)"""
+    width = (until - since) / count
+    columns = [[] for _ in range(count)]
+    for timestamp, values in points:
+        columns[min(int((timestamp - since) / width), count - 1)].append((timestamp, values))
+    return [(since + index * width, column) for index, column in enumerate(columns) if column]
+
+def _change(first, last):
+    change = last - first
+    percent = f", {change / first * 100:+.1f}%" if first else ""
+    return f"{first:,} → {last:,} ({change:+,}{percent})"
+
+def format_growth(points, since, until, level):
+    """Render stats history points as a /growth report"""
+    if not points:
+        return "No stats history recorded for this range yet."
+    
+    first, last = points[0][1], points[-1][1]
+    updates = sum(values.get("updates", 0) for timestamp, values in points)
+    lines = [
+        f"👥 Users: {_change(first.get('users', 0), last.get('users', 0))}",
+        f"💬 Chats: {_change(first.get('chats', 0), last.get('chats', 0))}",
+        f"📨 Updates handled: {updates:,}",
+        "",
+        f"`{sparkline([column[-1][1].get('users', 0) for start, column in _columns(points, since, until, SPARK_WIDTH)])}`",
+        ""
+    ]
+    
+    # Short ranges show times, longer ones dates
+    date_format = "%d %b %H:%M" if until - since <= 2 * 86400 else "%d %b"
+    previous = first
+    for start, column in _columns(points, since, until, REPORT_ROWS):
+        current = column[-1][1]
+        column_updates = sum(values.get("updates", 0) for timestamp, values in column)
+        lines.append(
+            f"`{datetime.fromtimestamp(start).strftime(date_format)}` "
+            f"👥 {current.get('users', 0) - previous.get('users', 0):+,} "
+            f"💬 {current.get('chats', 0) - previous.get('chats', 0):+,} "
+            f"📨 {column_updates:,}"
+        )
+        previous = current
+    
+    lines.append(f"\n_{len(points)} {level} points_")
+    return "\n".join(lines)
+
+async def growth_command_handler(client, message: Message):
+    """Show growth over a range read from the bucketed history: /growth [24h|7d|4w|6m|1y]"""
+    text = message.command[1] if len(message.command) > 1 else DEFAULT_RANGE
+    seconds = parse_range(text)
+    if seconds is None:
+        await message.reply_text("Usage: `/growth [range]`, e.g. `24h`, `7d`, `4w`, `6m` or `1y`")
+        return
+    
+    until = time.time()
+    since = until - seconds
+    level = choose_level(seconds)
+    points = await get_stats_history(level, since, until)
+    await message.reply_text(f"📈 **Growth over the last {text}**\n\n{format_growth(points, since, until, level)}")
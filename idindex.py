@@ -0,0 +1,97 @@
+"""
+Known-id index: every user or chat id in the database kept in memory as sorted 64-bit integers,
+so membership and exact counts need no round trip, at 8 bytes an id
+"""
+import logging
+from array import array
+from bisect import bisect_left, insort
+
+logger = logging.getLogger(__name__)
+
+# New ids are kept in a small sorted array and merged into the main one when it grows past this
+# (or past 1/256 of the main array, so merges stay rare with millions of ids)
+MIN_MERGE_SIZE = 4096
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+class IdIndex:
+    """Sorted array-backed set of ids, filled from a streamed projection and kept current on writes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.ids = array("q")
+        self.recent = array("q")
+        self.ready = False
+        self.warming = False
+        # Whether this process sees every insert, so len() is an exact count
+        self.exact = False
+
+    def __contains__(self, value):
+        return _contains(self.ids, value) or _contains(self.recent, value)
+
+    def __len__(self):
+        return len(self.ids) + len(self.recent)
+
+    @property
+    def nbytes(self):
+        """Memory held by the id arrays"""
+        return (len(self.ids) + len(self.recent)) * self.ids.itemsize
+
+    def add(self, value):
+        """Record an id; returns False if it was already known"""
+        if value in self:
+            return False
+        insort(self.recent, value)
+        # While warming, the main array is about to be replaced, so new ids wait in the recent one
+        if not self.warming and len(self.recent) >= max(MIN_MERGE_SIZE, len(self.ids) // 256):
+            self._merge()
+        return True
+
+    def _merge(self):
+        """Fold the recent ids into the main array with slice copies, not per-item work"""
+        merged = array("q")
+        start = 0
+        for value in self.recent:
+            end = bisect_left(self.ids, value, start)
+            merged.extend(self.ids[start:end])
+            # Ids written while warming can also arrive in the stream
+            if end == len(self.ids) or self.ids[end] != value:
+                merged.append(value)
+            start = end
+        merged.extend(self.ids[start:])
+        self.ids = merged
+        self.recent = array("q")
+
+    async def warm(self, stream, exact=False):
+        """Load every id from an async stream (ascending order is cheapest); adds keep working meanwhile"""
+        ids = array("q")
+        ordered = True
+        self.warming = True
+        try:
+            async for value in stream:
+                if ids and value <= ids[-1]:
+                    if value == ids[-1]:
+                        continue
+                    ordered = False
+                ids.append(value)
+        finally:
+            self.warming = False
+        
+        if not ordered:
+            ids = array("q", sorted(set(ids)))
+        
+        # Swap in the loaded ids, then fold in anything added while they streamed
+        self.ids = ids
+        self._merge()
+        self.ready = True
+        self.exact = exact
+        logger.info(f"Known {self.name} index warmed with {len(self):,} ids ({self.nbytes / 1024 / 1024:.1f} MB)")
+
+    def clear(self):
+        """Forget every id and mark the index cold"""
+        self.ids = array("q")
+        self.recent = array("q")
+        self.ready = False
+        self.exact = False
@@ -0,0 +1,310 @@
+"""
+Lightweight in-process metrics: latency histograms with call and error counts, and event counters
+"""
+import time
+import asyncio
+import inspect
+import logging
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+import psutil
+
+from utils import get_readable_time, get_readable_file_size
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency buckets: 0.5ms doubling up to ~65s
+BUCKETS = tuple(0.0005 * 2 ** i for i in range(18))
+
+class Metric:
+    """Counters and a fixed-bucket latency histogram for one operation"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds, error=False):
+        """Record one call"""
+        self.count += 1
+        self.total_time += seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        if error:
+            self.errors += 1
+
+    def percentile(self, q):
+        """Estimate a latency percentile (seconds) from the histogram buckets"""
+        if self.count == 0:
+            return 0.0
+        
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return float("inf")
+
+class Counter:
+    """Count of events that have no duration, such as updates received or requests dropped"""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+# All metrics and counters by name
+registry = {}
+counters = {}
+
+def get_metric(name):
+    """Get or create the metric for name"""
+    metric = registry.get(name)
+    if metric is None:
+        metric = registry[name] = Metric(name)
+    return metric
+
+def get_counter(name):
+    """Get or create the counter for name"""
+    counter = counters.get(name)
+    if counter is None:
+        counter = counters[name] = Counter(name)
+    return counter
+
+async def _observe_call(metric, func, args, kwargs):
+    """Await func and record its latency and whether it raised"""
+    start = time.perf_counter()
+    error = False
+    try:
+        return await func(*args, **kwargs)
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        error = True
+        raise
+    finally:
+        metric.observe(time.perf_counter() - start, error)
+
+def timed(name, func):
+    """Wrap a coroutine function so every call is recorded under name"""
+    metric = get_metric(name)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await _observe_call(metric, func, args, kwargs)
+    
+    wrapper.__metric__ = metric
+    return wrapper
+
+def instrument_module(namespace, prefix):
+    """Wrap every public coroutine function in a module namespace (e.g. globals())"""
+    for name, value in list(namespace.items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(value):
+            continue
+        if hasattr(value, "__metric__") or value.__module__ != namespace.get("__name__"):
+            continue
+        namespace[name] = timed(f"{prefix}.{name}", value)
+
+def instrument_router(router):
+    """Wrap every command registered on a CommandRouter"""
+    for name, handler in list(router.commands.items()):
+        if not hasattr(handler, "__metric__"):
+            router.commands[name] = timed(f"command.{name}", handler)
+
+def instrument_client(client):
+    """Wrap every registered handler and the client's raw API calls"""
+    for handlers in client.dispatcher.groups.values():
+        for handler in handlers:
+            if not hasattr(handler.callback, "__metric__"):
+                handler.callback = timed(f"handler.{handler.callback.__name__}", handler.callback)
+    
+    # Every high-level method goes through invoke(), so this covers all API calls; under the outbound
+    # scheduler the raw call is timed, so time spent queued for a send is not counted as API latency
+    owner = client.invoke if hasattr(client.invoke, "invoke") else client
+    if not hasattr(owner.invoke, "__metric__"):
+        invoke = owner.invoke
+
+        @wraps(invoke)
+        async def timed_invoke(query, *args, **kwargs):
+            metric = get_metric(f"telegram.{type(query).__name__}")
+            return await _observe_call(metric, invoke, (query, *args), kwargs)
+        
+        timed_invoke.__metric__ = None
+        owner.invoke = timed_invoke
+        _count_updates(client)
+
+def _count_updates(client):
+    """Count raw updates as they are queued for the dispatcher"""
+    queue = client.dispatcher.updates_queue
+    put_nowait = queue.put_nowait
+    counter = get_counter("updates")
+
+    def counting_put_nowait(item):
+        # None is the dispatcher's stop sentinel, not an update
+        if item is not None:
+            counter.inc()
+        put_nowait(item)
+    
+    queue.put_nowait = counting_put_nowait
+
+def format_metrics(limit=25):
+    """Render the busiest metrics as a text table for the /metrics command"""
+    metrics = sorted(registry.values(), key=lambda metric: metric.count, reverse=True)[:limit]
+    if not metrics and not counters:
+        return "No metrics recorded yet."
+    
+    lines = ["📈 **Metrics** (count / errors / p50 / p95 / p99 ms)\n"]
+    for metric in metrics:
+        p50, p95, p99 = (metric.percentile(q) * 1000 for q in (0.5, 0.95, 0.99))
+        lines.append(
+            f"`{metric.name}`: {metric.count} / {metric.errors} / "
+            f"{p50:.1f} / {p95:.1f} / {p99:.1f}"
+        )
+    
+    # Counters have no latency, so they are listed separately
+    if counters:
+        lines.append("\n🔢 **Counters**\n")
+        for counter in sorted(counters.values(), key=lambda counter: counter.value, reverse=True):
+            lines.append(f"`{counter.name}`: {counter.value}")
+    return "\n".join(lines)
+
+def prometheus_text():
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP lisax_latency_seconds Latency of handlers, database and Telegram API calls",
+        "# TYPE lisax_latency_seconds histogram"
+    ]
+    for metric in registry.values():
+        label = f'name="{metric.name}"'
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, metric.buckets):
+            cumulative += bucket_count
+            lines.append(f'lisax_latency_seconds_bucket{{{label},le="{bound:g}"}} {cumulative}')
+        lines.append(f'lisax_latency_seconds_bucket{{{label},le="+Inf"}} {metric.count}')
+        lines.append(f"lisax_latency_seconds_sum{{{label}}} {metric.total_time}")
+        lines.append(f"lisax_latency_seconds_count{{{label}}} {metric.count}")
+    
+    lines.append("# HELP lisax_errors_total Calls that raised an exception")
+    lines.append("# TYPE lisax_errors_total counter")
+    for metric in registry.values():
+        lines.append(f'lisax_errors_total{{name="{metric.name}"}} {metric.errors}')
+    
+    lines.append("# HELP lisax_events_total Events counted without a latency, such as updates received")
+    lines.append("# TYPE lisax_events_total counter")
+    for counter in counters.values():
+        lines.append(f'lisax_events_total{{name="{counter.name}"}} {counter.value}')
+    
+    return "\n".join(lines) + "\n"
+
+async def _handle_http(reader, writer):
+    """Answer any request with the Prometheus metrics page"""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = prometheus_text().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics over HTTP on a local port; returns the server"""
+    server = await asyncio.start_server(_handle_http, host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
+
+# Extra runtime values sampled alongside process stats: label -> zero-argument callable
+gauges = {}
+
+def register_gauge(label, func):
+    """Sample func() under label on every runtime sample"""
+    gauges[label] = func
+
+class RuntimeSampler:
+    """Background sampler keeping recent process and bot figures in a ring buffer"""
+
+    def __init__(self, interval=10, history=100):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.process = psutil.Process()
+        self._task = None
+
+    def sample(self):
+        """Take one sample of process, event loop and registered gauge values"""
+        with self.process.oneshot():
+            sample = {
+                "time": time.monotonic(),
+                "rss": self.process.memory_info().rss,
+                "cpu": self.process.cpu_percent(interval=None),
+                "sockets": len(self.process.connections(kind="inet")),
+                "tasks": len(asyncio.all_tasks()),
+                "updates": get_counter("updates").value,
+                "gauges": {label: func() for label, func in gauges.items()}
+            }
+        self.samples.append(sample)
+        return sample
+
+    async def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling runtime stats: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start sampling in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def rate(self, field, seconds):
+        """Per-second rate of a cumulative field over roughly the last `seconds`"""
+        if len(self.samples) < 2:
+            return 0.0
+        
+        latest = self.samples[-1]
+        base = self.samples[0]
+        for sample in self.samples:
+            if latest["time"] - sample["time"] <= seconds:
+                base = sample
+                break
+        
+        elapsed = latest["time"] - base["time"]
+        return (latest[field] - base[field]) / elapsed if elapsed > 0 else 0.0
+
+runtime_sampler = RuntimeSampler()
+
+def format_runtime_stats():
+    """Render the latest runtime sample for /adminstats"""
+    if not runtime_sampler.samples:
+        return "Runtime stats are not sampled yet."
+    
+    sample = runtime_sampler.samples[-1]
+    uptime = get_readable_time(int(time.time() - runtime_sampler.process.create_time()))
+    throughput = " / ".join(
+        f"{runtime_sampler.rate('updates', minutes * 60):.2f}" for minutes in (1, 5, 15)
+    )
+    
+    lines = [
+        f"⏱️ Uptime: {uptime}",
+        f"🧠 Memory: {get_readable_file_size(sample['rss'])}",
+        f"⚙️ CPU: {sample['cpu']:.1f}%",
+        f"🔌 Open sockets: {sample['sockets']}",
+        f"🧵 Asyncio tasks: {sample['tasks']}",
+        f"📨 Updates/s (1m / 5m / 15m): {throughput}"
+    ]
+    for label, value in sample["gauges"].items():
+        lines.append(f"▫️ {label}: {value}")
+    return "\n".join(lines)
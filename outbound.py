@@ -0,0 +1,143 @@
+"""
+Outbound scheduling: every message send or edit waits on its chat's token bucket and a global one,
+handler replies ahead of bulk sends; replies are dropped rather than holding a handler for long
+"""
+import asyncio
+import logging
+import contextvars
+from functools import wraps
+from pyrogram import raw, utils as pyrogram_utils
+from pyrogram.errors import FloodWait
+
+from cache import LRUCache
+from ratelimit import TokenBucket, PriorityTokenBucket
+from metrics import get_counter, register_gauge
+from config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_PRIVATE_RATE, OUTBOUND_PRIVATE_BURST,
+    OUTBOUND_GROUP_RATE, OUTBOUND_GROUP_BURST, OUTBOUND_MAX_REPLY_WAIT, OUTBOUND_CHAT_BUCKETS
+)
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes of the global bucket, served in this order
+INTERACTIVE = 0
+BULK = 1
+
+# Priority of sends made from the current task (tasks inherit it from the task that created them)
+outbound_priority = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Requests that post to a chat, by the field holding the target peer
+OUTBOUND_QUERIES = {
+    raw.functions.messages.SendMessage: "peer",
+    raw.functions.messages.SendMedia: "peer",
+    raw.functions.messages.SendMultiMedia: "peer",
+    raw.functions.messages.ForwardMessages: "to_peer",
+    raw.functions.messages.EditMessage: "peer"
+}
+
+class ReplyDropped(Exception):
+    """An interactive send that could not go out within OUTBOUND_MAX_REPLY_WAIT"""
+
+def _peer_chat(peer):
+    """Chat id of an input peer and whether it is a private chat (None for peers without one)"""
+    if isinstance(peer, raw.types.InputPeerUser):
+        return peer.user_id, True
+    if isinstance(peer, raw.types.InputPeerChat):
+        return -peer.chat_id, False
+    if isinstance(peer, raw.types.InputPeerChannel):
+        return pyrogram_utils.get_channel_id(peer.channel_id), False
+    return None, True
+
+class OutboundScheduler:
+    """Rate-limit a client's sends per chat and globally"""
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, max_reply_wait=OUTBOUND_MAX_REPLY_WAIT):
+        self.global_bucket = PriorityTokenBucket(global_rate, lanes=2)
+        self.max_reply_wait = max_reply_wait
+        self.chats = LRUCache(maxsize=OUTBOUND_CHAT_BUCKETS)
+        self.absorbed = get_counter("outbound.flood_wait")
+        self.dropped = get_counter("outbound.dropped")
+
+    def chat_bucket(self, chat_id, private):
+        """Token bucket of one chat: about one message a second in private, 20 a minute in groups"""
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if private:
+                bucket = TokenBucket(OUTBOUND_PRIVATE_RATE, OUTBOUND_PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(OUTBOUND_GROUP_RATE / 60, OUTBOUND_GROUP_BURST)
+            self.chats.set(chat_id, bucket)
+        return bucket
+
+    async def _wait_turn(self, acquire, deadline, chat_id):
+        """Await a bucket, giving up once the deadline (None for no limit) has passed"""
+        if deadline is None:
+            return await acquire
+        try:
+            await asyncio.wait_for(acquire, max(deadline - asyncio.get_running_loop().time(), 0))
+        except asyncio.TimeoutError:
+            self.dropped.inc()
+            raise ReplyDropped(f"Reply to {chat_id} not sent within {self.max_reply_wait}s") from None
+
+    async def send(self, invoke, query, peer, args, kwargs):
+        """Run one outbound request once its chat and the global bucket allow it"""
+        chat_id, private = _peer_chat(peer)
+        bucket = self.chat_bucket(chat_id, private) if chat_id is not None else None
+        lane = outbound_priority.get()
+        
+        # Replies are sent from handler tasks, so one busy chat must not hold them (and every other chat) for long
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_reply_wait if lane == INTERACTIVE else None
+        
+        # FloodWaits come back here instead of being slept on inside Pyrogram
+        kwargs.setdefault("sleep_threshold", 0)
+        flood_waited = False
+        while True:
+            # The chat's turn comes first so a busy chat never holds a global token
+            if bucket is not None:
+                await self._wait_turn(bucket.acquire(), deadline, chat_id)
+            await self._wait_turn(self.global_bucket.acquire(lane=lane), deadline, chat_id)
+            try:
+                result = await invoke(query, *args, **kwargs)
+            except FloodWait as e:
+                # Everything else queued for this chat waits too
+                if bucket is not None:
+                    bucket.pause(e.value)
+                
+                # Bulk senders (broadcasts) handle FloodWait themselves, by pausing all their sends
+                if deadline is None:
+                    raise
+                if loop.time() + e.value > deadline:
+                    self.dropped.inc()
+                    raise ReplyDropped(f"Reply to {chat_id} dropped on a FloodWait of {e.value}s") from e
+                flood_waited = True
+                logger.warning(f"FloodWait of {e.value}s sending to {chat_id}, retrying after it")
+                if bucket is None:
+                    await asyncio.sleep(e.value)
+                continue
+            
+            # A FloodWait counts as absorbed only once the retry has gone out
+            if flood_waited:
+                self.absorbed.inc()
+            return result
+
+def install_outbound_scheduler(client):
+    """Route the client's sends and edits through an OutboundScheduler"""
+    scheduler = OutboundScheduler()
+
+    @wraps(client.invoke)
+    async def scheduled_invoke(query, *args, **kwargs):
+        # Read on every call so instrument_client can time the raw call underneath the scheduler
+        invoke = scheduled_invoke.invoke
+        field = OUTBOUND_QUERIES.get(type(query))
+        if field is None:
+            return await invoke(query, *args, **kwargs)
+        return await scheduler.send(invoke, query, getattr(query, field), args, kwargs)
+    
+    scheduled_invoke.invoke = client.invoke
+    client.invoke = scheduled_invoke
+    register_gauge(
+        "Outbound queued (interactive / bulk)",
+        lambda: f"{scheduler.global_bucket.waiting(INTERACTIVE)} / {scheduler.global_bucket.waiting(BULK)}"
+    )
+    return scheduler
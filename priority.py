@@ -0,0 +1,113 @@
+"""
+Prioritised update dispatch: interactive updates (commands, button presses, joins) are handled
+before background tracking work, and tracking is shed when the backlog grows too large
+"""
+import asyncio
+import logging
+from collections import deque
+from pyrogram import raw
+
+from metrics import get_counter, register_gauge
+from config import DISPATCH_INTERACTIVE_LIMIT, DISPATCH_BACKGROUND_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Updates a user is waiting on a reply for
+INTERACTIVE_UPDATES = (
+    raw.types.UpdateBotCallbackQuery,
+    raw.types.UpdateInlineBotCallbackQuery,
+    raw.types.UpdateBotInlineQuery
+)
+MESSAGE_UPDATES = (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)
+
+def is_interactive(update, prefixes=("/",)):
+    """Check whether a raw update needs a visible reply rather than only tracking"""
+    if isinstance(update, INTERACTIVE_UPDATES):
+        return True
+    if not isinstance(update, MESSAGE_UPDATES):
+        return False
+    
+    message = update.message
+    # Members joining get a welcome message
+    if isinstance(message, raw.types.MessageService):
+        return isinstance(message.action, (raw.types.MessageActionChatAddUser, raw.types.MessageActionChatJoinedByLink))
+    text = getattr(message, "message", None)
+    return bool(text) and text.startswith(prefixes)
+
+class PriorityUpdateQueue:
+    """Drop-in for the dispatcher's update queue with an interactive and a background lane"""
+
+    def __init__(self, prefixes=("/",), interactive_limit=DISPATCH_INTERACTIVE_LIMIT, background_limit=DISPATCH_BACKGROUND_LIMIT):
+        self.prefixes = tuple(prefixes)
+        self.interactive = deque()
+        self.background = deque()
+        self.interactive_limit = interactive_limit
+        self.background_limit = background_limit
+        self.shed = get_counter("updates.shed")
+        self._stops = 0
+        self._waiters = deque()
+
+    def __len__(self):
+        return len(self.interactive) + len(self.background) + self._stops
+
+    def put_nowait(self, packet):
+        """Queue an (update, users, chats) packet; None is the dispatcher's stop sentinel"""
+        # Stop sentinels are handed out only once both lanes are drained
+        if packet is None:
+            self._stops += 1
+            self._wake()
+            return
+        
+        if is_interactive(packet[0], self.prefixes):
+            lane, limit = self.interactive, self.interactive_limit
+        else:
+            lane, limit = self.background, self.background_limit
+        
+        # Over the limit, the oldest update in the lane is dropped as the most stale one
+        if len(lane) >= limit:
+            lane.popleft()
+            self.shed.inc()
+            if self.shed.value % 1000 == 1:
+                logger.warning(f"Update backlog over {limit}, shedding ({self.shed.value} dropped so far)")
+        
+        lane.append(packet)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def get(self):
+        """Wait for the next packet, interactive ones first"""
+        while not len(self):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                # Pass on a wakeup this waiter consumed without using it
+                if len(self) and not waiter.cancelled():
+                    self._wake()
+                raise
+        
+        if self.interactive:
+            return self.interactive.popleft()
+        if self.background:
+            return self.background.popleft()
+        self._stops -= 1
+        return None
+
+def install_priority_queue(client, prefixes=("/",)):
+    """Replace the client's update queue; call before the client (and its dispatcher) starts"""
+    queue = PriorityUpdateQueue(prefixes)
+    client.dispatcher.updates_queue = queue
+    register_gauge("Queued updates (interactive / background)", lambda: f"{len(queue.interactive)} / {len(queue.background)}")
+    return queue
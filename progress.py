@@ -0,0 +1,133 @@
+"""
+Live progress reports for long-running jobs: one status message, edited at an interval that
+follows the job's rate, backing off on FloodWait and ending with exactly one final report
+"""
+import time
+import asyncio
+import logging
+from pyrogram.errors import FloodWait, MessageNotModified, RPCError
+
+from utils import get_readable_time
+from config import PROGRESS_MIN_INTERVAL, PROGRESS_MAX_INTERVAL, PROGRESS_SMOOTHING
+
+logger = logging.getLogger(__name__)
+
+# Aim for one edit per this fraction of the job
+PROGRESS_STEP = 0.01
+
+# Longest FloodWait the final report waits out by default
+FINAL_REPORT_MAX_WAIT = 300
+
+class ProgressReporter:
+    """Keep a status message up to date with a job's progress"""
+
+    def __init__(self, client, chat_id, message_id, render, progress, bucket=None,
+                 min_interval=PROGRESS_MIN_INTERVAL, max_interval=PROGRESS_MAX_INTERVAL, smoothing=PROGRESS_SMOOTHING):
+        self.client = client
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.render = render
+        self.progress = progress
+        self.bucket = bucket
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.interval = min_interval
+        self.rate = None
+        self.last_text = None
+        self.blocked_until = 0
+        self._last_sample = None
+        self._task = None
+        self._finished = False
+
+    def eta(self):
+        """Seconds left at the smoothed rate, or None while the rate is unknown"""
+        if not self.rate:
+            return None
+        done, total = self.progress()
+        return max(total - done, 0) / self.rate
+
+    def eta_text(self):
+        eta = self.eta()
+        return get_readable_time(int(eta)) if eta is not None else "Unknown"
+
+    def sample(self):
+        """Fold progress since the last sample into the smoothed rate and pick the next interval"""
+        now = time.monotonic()
+        done, total = self.progress()
+        if self._last_sample is not None:
+            last_time, last_done = self._last_sample
+            if now > last_time:
+                current = (done - last_done) / (now - last_time)
+                self.rate = current if self.rate is None else self.smoothing * current + (1 - self.smoothing) * self.rate
+        self._last_sample = (now, done)
+        
+        # Edit when about PROGRESS_STEP of the job is done; a stalled job is checked rarely
+        if self.rate:
+            self.interval = min(max(total * PROGRESS_STEP / self.rate, self.min_interval), self.max_interval)
+        elif self.rate is not None:
+            self.interval = self.max_interval
+
+    async def _edit(self, text):
+        """Edit the status message; returns False when Telegram asks to wait"""
+        try:
+            await self.client.edit_message_text(self.chat_id, self.message_id, text)
+        except FloodWait as e:
+            # Only reports back off; the job's own sends are not paused for an edit
+            self.blocked_until = time.monotonic() + e.value
+            self.min_interval = min(self.min_interval * 2, self.max_interval)
+            logger.warning(f"FloodWait of {e.value}s on progress report, slowing edits to every {self.min_interval:.0f}s or more")
+            return False
+        except MessageNotModified:
+            pass
+        except RPCError as e:
+            logger.debug(f"Could not update progress report: {e}")
+        
+        self.last_text = text
+        return True
+
+    def _held_back(self):
+        """Check whether an edit now would run into a FloodWait, the job's or its own"""
+        return time.monotonic() < self.blocked_until or (self.bucket is not None and self.bucket.paused)
+
+    async def _run(self):
+        self.sample()
+        while True:
+            await asyncio.sleep(max(self.interval, self.blocked_until - time.monotonic()))
+            self.sample()
+            if self._held_back():
+                continue
+            
+            # Unchanged renders are not sent
+            text = self.render(self)
+            if text != self.last_text:
+                await self._edit(text)
+
+    def start(self):
+        """Start editing the status message in the background"""
+        if self._task is None and not self._finished:
+            self._task = asyncio.create_task(self._run())
+
+    async def _stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def finish(self, text, max_wait=FINAL_REPORT_MAX_WAIT):
+        """Stop periodic edits and send the final report once, waiting out FloodWaits up to max_wait"""
+        if self._finished:
+            return False
+        self._finished = True
+        await self._stop()
+        
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.blocked_until - time.monotonic()
+            if wait > 0:
+                if time.monotonic() + wait > deadline:
+                    logger.warning(f"Final progress report dropped, Telegram asked to wait {wait:.0f}s")
+                    return False
+                await asyncio.sleep(wait)
+            if await self._edit(text):
+                return True
@@ -0,0 +1,150 @@
+import time
+import asyncio
+from collections import deque, OrderedDict
+
+class TokenBucket:
+    """Async token bucket that refills at a fixed rate and can be paused"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        # Below one token acquire() could never succeed, e.g. with a rate under 1/s and no burst
+        self.capacity = max(capacity or rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        """Add the tokens earned since the last refill"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens=1):
+        """Wait until tokens are available and take them"""
+        # The lock makes waiters queue up in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                
+                # Respect any pause (e.g. a FloodWait) before handing out tokens
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    @property
+    def paused(self):
+        """Whether tokens are being held back by a pause"""
+        return time.monotonic() < self.paused_until
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # One token is ready when the pause ends, so the first caller waits out the pause and no more
+        self.tokens = 1
+        self.updated_at = self.paused_until
+
+class PriorityTokenBucket(TokenBucket):
+    """Token bucket serving waiters by lane (lane 0 first), in FIFO order within a lane"""
+
+    def __init__(self, rate, capacity=None, lanes=2):
+        super().__init__(rate, capacity)
+        self.lanes = [deque() for _ in range(lanes)]
+        self._pump = None
+
+    def waiting(self, lane):
+        """Number of callers queued in a lane"""
+        return len(self.lanes[lane])
+
+    async def acquire(self, tokens=1, lane=0):
+        """Wait until tokens are available for this lane and take them"""
+        # Take a token straight away when nobody is queued ahead
+        now = time.monotonic()
+        if not any(self.lanes) and now >= self.paused_until:
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self.lanes[lane].append((tokens, waiter))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await waiter
+
+    async def _run(self):
+        """Hand out tokens to queued waiters, highest-priority lane first"""
+        while any(self.lanes):
+            lane = next(lane for lane in self.lanes if lane)
+            tokens, waiter = lane[0]
+            # Cancelled callers give up their place
+            if waiter.done():
+                lane.popleft()
+                continue
+            
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                lane.popleft()
+                waiter.set_result(None)
+                continue
+            
+            # Re-check the lanes after each token, so a newly queued higher-priority caller goes next
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+class SlidingWindowCounter:
+    """Approximate per-key sliding-window hit counts, three numbers per key, idle keys expiring"""
+
+    def __init__(self, window, maxsize=50000):
+        self.window = window
+        self.maxsize = maxsize
+        # key -> (current window start, hits in the previous window, hits in the current one)
+        self._windows = OrderedDict()
+
+    def _expire(self, now):
+        """Drop keys idle for two windows (their counts no longer matter) and the oldest past maxsize"""
+        while self._windows:
+            key, (start, previous, current) = next(iter(self._windows.items()))
+            if start + 2 * self.window > now and len(self._windows) <= self.maxsize:
+                break
+            self._windows.popitem(last=False)
+
+    def _roll(self, key, now):
+        """The key's window, moved forward to the one containing now"""
+        start, previous, current = self._windows.get(key, (now, 0, 0))
+        elapsed = int((now - start) // self.window)
+        if elapsed == 1:
+            return start + self.window, current, 0
+        if elapsed > 1:
+            return start + elapsed * self.window, 0, 0
+        return start, previous, current
+
+    def count(self, key, now=None):
+        """Hits in the last window, weighting the previous window by how much of it still overlaps"""
+        now = time.monotonic() if now is None else now
+        start, previous, current = self._roll(key, now)
+        return previous * (1 - (now - start) / self.window) + current
+
+    def add(self, key, now=None):
+        """Record a hit for key"""
+        now = time.monotonic() if now is None else now
+        start, previous, current = self._roll(key, now)
+        
+        # Recently hit keys move to the end, so expired ones collect at the front
+        self._windows[key] = (start, previous, current + 1)
+        self._windows.move_to_end(key)
+        self._expire(now)
+
+    def __len__(self):
+        return len(self._windows)
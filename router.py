@@ -0,0 +1,92 @@
+"""
+Command router: one filter and one dict lookup per update instead of a filter per command
+"""
+import re
+import logging
+from pyrogram import filters
+from pyrogram.types import Message
+
+from outbound import ReplyDropped
+
+logger = logging.getLogger(__name__)
+
+# Same argument splitting as pyrogram's command filter (quoted or whitespace separated)
+ARGUMENT_RE = re.compile(r"([\"'])(.*?)(?<!\\)\1|(\S+)")
+
+class CommandRouter:
+    """Registry of command handlers dispatched by command name"""
+
+    def __init__(self, prefixes="/", throttle=None):
+        self.prefixes = tuple(prefixes)
+        self.commands = {}
+        self.throttle = throttle
+        
+        prefixes = self.prefixes
+
+        async def looks_like_command(_, __, message: Message):
+            text = message.text or message.caption
+            return bool(text) and text.startswith(prefixes)
+        
+        # Cheap pre-check so non-command updates never reach the dispatcher
+        self.filter = filters.create(looks_like_command, "RouterFilter")
+
+    def command(self, *names):
+        """Decorator registering a handler for one or more command names"""
+        def decorator(func):
+            for name in names:
+                self.commands[name.lower()] = func
+            return func
+        return decorator
+
+    def resolve(self, message: Message, username=None):
+        """Parse the command token once and return its handler, or None"""
+        text = message.text or message.caption
+        prefix = next((prefix for prefix in self.prefixes if text and text.startswith(prefix)), None)
+        if prefix is None:
+            return None
+        
+        # Like pyrogram's command filter, the command must follow the prefix directly ("/ start" is not one)
+        body = text[len(prefix):]
+        if not body or body[0].isspace():
+            return None
+        parts = body.split(maxsplit=1)
+        name, _, mention = parts[0].partition("@")
+        arguments = parts[1] if len(parts) > 1 else ""
+        
+        # Commands addressed to another bot (/start@OtherBot) are not ours
+        if mention and username and mention.lower() != username.lower():
+            return None
+        
+        handler = self.commands.get(name.lower())
+        if handler is None:
+            return None
+        
+        # Fill message.command the way pyrogram's command filter does
+        message.command = [name.lower()] + [
+            re.sub(r"\\([\"'])", r"\1", match.group(2) or match.group(3) or "")
+            for match in ARGUMENT_RE.finditer(arguments)
+        ]
+        return handler
+
+    async def dispatch(self, client, message: Message):
+        """Run the handler registered for the message's command, if any"""
+        username = client.me.username if client.me else None
+        handler = self.resolve(message, username)
+        if handler is None:
+            return
+        
+        # Throttled commands are dropped without a reply, which would only add to the load
+        if self.throttle is not None and not self.throttle.allow_message(message):
+            return
+        try:
+            await handler(client, message)
+        except ReplyDropped as e:
+            # The chat is sending faster than Telegram allows; the reply is given up, not queued
+            logger.debug(f"Command {message.command[0]} not answered: {e}")
+
+def command(*names):
+    """Mark a function as the handler for command names; load_plugins registers it on the app's router"""
+    def decorator(func):
+        func.commands = getattr(func, "commands", []) + list(names)
+        return func
+    return decorator
@@ -0,0 +1,96 @@
+"""
+Screen registry: prebuilt keyboards, dict-based callback dispatch and no-op edit suppression
+"""
+import logging
+from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from pyrogram.errors import MessageNotModified
+
+from db import get_users_count, get_chats_count
+from cache import LRUCache
+from config import WELCOME_MESSAGE, HELP_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# Screens by name; the name doubles as the callback data of buttons opening it
+screens = {}
+
+# Hash of what each message currently shows, so identical edits can be skipped
+rendered = LRUCache(maxsize=50000, ttl=86400)
+
+class Screen:
+    """A page of text with a keyboard that is built once and never modified"""
+
+    def __init__(self, name, buttons, text=None, render=None):
+        self.name = name
+        self.text = text
+        self.render_text = render
+        self.keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(label, callback_data=data) for label, data in row] for row in buttons]
+        )
+
+    async def render(self):
+        """Get the text to show; static screens skip any formatting work"""
+        if self.render_text is None:
+            return self.text
+        return await self.render_text()
+
+def register_screen(name, buttons, text=None, render=None):
+    """Add a screen to the registry"""
+    screens[name] = Screen(name, buttons, text, render)
+    return screens[name]
+
+async def render_stats():
+    """Format the bot statistics page"""
+    users_count = await get_users_count()
+    chats_count = await get_chats_count()
+    
+    return f"""
+📊 **Bot Statistics**
+
+👥 Users: {users_count}
+💬 Chats: {chats_count}
+    """
+
+register_screen("start", [[("📚 Help", "help"), ("📊 Stats", "stats")]], text=WELCOME_MESSAGE)
+register_screen("help", [[("🏠 Home", "start"), ("📊 Stats", "stats")]], text=HELP_MESSAGE)
+register_screen("stats", [[("🏠 Home", "start"), ("📚 Help", "help")]], render=render_stats)
+
+def _render_key(chat_id, message_id):
+    return (chat_id, message_id)
+
+async def send_screen(message: Message, name):
+    """Reply to a message with a screen and remember what was sent"""
+    screen = screens[name]
+    text = await screen.render()
+    sent = await message.reply_text(text, reply_markup=screen.keyboard)
+    
+    rendered.set(_render_key(sent.chat.id, sent.id), hash((name, text)))
+    return sent
+
+async def handle_screen_callback(client, callback_query: CallbackQuery):
+    """Show the screen named by the callback data, skipping edits that change nothing"""
+    screen = screens.get(callback_query.data)
+    if screen is None:
+        # Unknown callback data, just answer the callback
+        await callback_query.answer("Unknown button action")
+        return
+    
+    text = await screen.render()
+    digest = hash((screen.name, text))
+    
+    # Inline-mode messages have no chat, only an inline message id
+    if callback_query.message:
+        key = _render_key(callback_query.message.chat.id, callback_query.message.id)
+    else:
+        key = callback_query.inline_message_id
+    
+    # Re-tapping the button for the current page costs only the answer below
+    if rendered.get(key) != digest:
+        try:
+            await callback_query.edit_message_text(text, reply_markup=screen.keyboard)
+        except MessageNotModified:
+            pass
+        rendered.set(key, digest)
+    
+    # Always answer the callback query to remove the loading state
+    await callback_query.answer()
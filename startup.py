@@ -0,0 +1,72 @@
+"""
+Startup orchestration: timed phases, run concurrently where independent, with non-critical
+work deferred until the bot is already handling updates
+"""
+import time
+import asyncio
+import inspect
+import logging
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class Startup:
+    """Run named startup phases and keep a timing breakdown of them"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = []
+        self.deferred = []
+        self.pool = None
+        self._report = None
+
+    async def step(self, name, func, *args):
+        """Run func(*args) (sync or async) as a named phase and record its timing"""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = func(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            self.timings.append((name, start - self.started, time.perf_counter() - start, status))
+
+    async def parallel(self, *steps):
+        """Run several (name, func, *args) phases concurrently"""
+        return await asyncio.gather(*(self.step(*step) for step in steps))
+
+    def defer(self, name, func, *args):
+        """Run a non-critical phase in the background"""
+        self.deferred.append(asyncio.create_task(self.step(name, func, *args)))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def since_process_start(self):
+        """Seconds since the process was created, including interpreter start and imports"""
+        return time.time() - psutil.Process().create_time()
+
+    def format_timings(self):
+        """Render the phases as a table of start offset, duration and status"""
+        lines = [f"{'phase':<24}{'start':>8}{'took':>8}  status"]
+        for name, offset, duration, status in sorted(self.timings, key=lambda timing: timing[1]):
+            lines.append(f"{name:<24}{offset:>7.2f}s{duration:>7.2f}s  {status}")
+        return "\n".join(lines)
+
+    async def finish(self):
+        """Wait for deferred phases and log the full timing table"""
+        await asyncio.gather(*self.deferred, return_exceptions=True)
+        for task in self.deferred:
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Deferred startup phase failed: {task.exception()}")
+        logger.info(f"Startup timings:\n{self.format_timings()}")
+
+    def report_when_done(self):
+        """Log the timing table in the background once deferred phases finish"""
+        self._report = asyncio.create_task(self.finish())
@@ -0,0 +1,635 @@
+"""
+Storage backends implementing the subset of the Motor collection API that db.py uses
+
+Collections support find_one, find (with sort, limit, to_list and async iteration), insert_one,
+update_one, bulk_write of UpdateOne operations, delete_many, count_documents,
+estimated_document_count and create_index. Queries may use equality and $gt, $gte, $lt, $lte, $ne,
+$in and $exists; updates may use $set, $inc and $setOnInsert, with dotted paths into subdocuments.
+"""
+import re
+import asyncio
+import sqlite3
+import logging
+import operator
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId, json_util
+from bson.errors import InvalidDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Range operators as Python comparisons and SQL operators
+COMPARISONS = {
+    "$gt": (operator.gt, ">"),
+    "$gte": (operator.ge, ">="),
+    "$lt": (operator.lt, "<"),
+    "$lte": (operator.le, "<=")
+}
+
+# Collection and field names are interpolated into SQL, so only plain identifiers are allowed
+NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+def _is_operator_dict(condition):
+    return isinstance(condition, dict) and any(key.startswith("$") for key in condition)
+
+def _matches(doc, query):
+    """Check a document against a query"""
+    for field, condition in (query or {}).items():
+        value = doc.get(field)
+        if not _is_operator_dict(condition):
+            if value != condition:
+                return False
+            continue
+        
+        for op, operand in condition.items():
+            if op in COMPARISONS:
+                try:
+                    if value is None or not COMPARISONS[op][0](value, operand):
+                        return False
+                except TypeError:
+                    return False
+            elif op == "$ne":
+                if value == operand:
+                    return False
+            elif op == "$in":
+                if value not in operand:
+                    return False
+            elif op == "$exists":
+                if (field in doc) != bool(operand):
+                    return False
+            else:
+                raise NotImplementedError(f"Unsupported query operator {op}")
+    return True
+
+def _parent(doc, field):
+    """Get the subdocument holding a dotted field path and the last key, creating missing levels"""
+    *path, key = field.split(".")
+    for part in path:
+        # Subdocuments are copied on write so documents already returned to callers never change
+        doc[part] = dict(doc.get(part) or {})
+        doc = doc[part]
+    return doc, key
+
+def _apply_update(doc, update, inserting):
+    """Apply $set/$inc/$setOnInsert to a document in place"""
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for field, value in fields.items():
+                parent, key = _parent(doc, field)
+                parent[key] = value
+        elif op == "$inc":
+            for field, amount in fields.items():
+                parent, key = _parent(doc, field)
+                parent[key] = parent.get(key, 0) + amount
+        elif op == "$setOnInsert":
+            continue
+        else:
+            raise NotImplementedError(f"Unsupported update operator {op}")
+
+def _new_document(query, update):
+    """Build the document an upsert inserts: the query's equality fields plus the update"""
+    doc = {field: value for field, value in query.items() if not _is_operator_dict(value)}
+    _apply_update(doc, update, inserting=True)
+    doc.setdefault("_id", ObjectId())
+    return doc
+
+def _project(doc, projection):
+    """Apply an inclusion or exclusion projection"""
+    if not projection:
+        return dict(doc)
+    
+    included = [field for field, wanted in projection.items() if wanted and field != "_id"]
+    if not included:
+        return {field: value for field, value in doc.items() if field not in projection}
+    
+    result = {field: doc[field] for field in included if field in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+def _unpack(operation):
+    """Get the filter, update and upsert flag of a bulk_write operation"""
+    if not isinstance(operation, UpdateOne):
+        raise NotImplementedError(f"Unsupported bulk operation {type(operation).__name__}")
+    return operation._filter, operation._doc, operation._upsert
+
+def _index_fields(keys):
+    """Normalise create_index keys ("field" or [("field", 1), ...]) to a list of field names"""
+    if isinstance(keys, str):
+        return [keys]
+    return [field for field, direction in keys]
+
+def _bulk_result(upserted_ids, write_errors):
+    """Build a bulk_write result, raising BulkWriteError like MongoDB when any operation failed"""
+    if write_errors:
+        raise BulkWriteError({
+            "writeErrors": write_errors,
+            "nUpserted": len(upserted_ids),
+            "upserted": [{"index": index, "_id": _id} for index, _id in upserted_ids.items()]
+        })
+    return SimpleNamespace(upserted_count=len(upserted_ids), upserted_ids=upserted_ids)
+
+def _duplicate_key_error(collection, field, value):
+    return DuplicateKeyError(
+        f"E11000 duplicate key error collection: {collection} index: {field} dup key: {value!r}",
+        11000
+    )
+
+class Database:
+    """A set of collections created on first access, like a Motor database"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def _create_collection(self, name):
+        raise NotImplementedError
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self._create_collection(name)
+        return collection
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    async def close(self):
+        """Release the backend's resources"""
+
+class MemoryCursor:
+    """Cursor over a snapshot of matching documents"""
+
+    def __init__(self, docs, projection=None):
+        self.docs = docs
+        self.projection = projection
+
+    def sort(self, key, direction=1):
+        # MongoDB orders missing/null values first
+        self.docs.sort(key=lambda doc: (doc.get(key) is not None, doc.get(key)), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        if count:
+            self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return [_project(doc, self.projection) for doc in self.docs[:length]]
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield _project(doc, self.projection)
+
+class MemoryCollection:
+    """Dict-backed collection with hash indexes for equality lookups"""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.indexes = {}
+        self.unique = set()
+
+    def _index(self, doc):
+        for field, index in self.indexes.items():
+            index.setdefault(doc.get(field), set()).add(doc["_id"])
+
+    def _unindex(self, doc):
+        for field, index in self.indexes.items():
+            ids = index.get(doc.get(field))
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del index[doc.get(field)]
+
+    def _find(self, query):
+        query = query or {}
+        
+        # Narrow down by _id or the first indexed equality field before filtering
+        candidates = None
+        for field, condition in query.items():
+            if _is_operator_dict(condition):
+                continue
+            if field == "_id":
+                doc = self.docs.get(condition)
+                candidates = [doc] if doc is not None else []
+                break
+            if field in self.indexes:
+                candidates = [self.docs[_id] for _id in self.indexes[field].get(condition, ())]
+                break
+        if candidates is None:
+            candidates = self.docs.values()
+        
+        return [doc for doc in candidates if _matches(doc, query)]
+
+    def _store(self, doc, old=None):
+        """Save a new version of a document, enforcing unique indexes"""
+        for field in self.unique:
+            if any(_id != doc["_id"] for _id in self.indexes[field].get(doc.get(field), ())):
+                raise _duplicate_key_error(self.name, field, doc.get(field))
+        
+        if old is not None:
+            self._unindex(old)
+        self.docs[doc["_id"]] = doc
+        self._index(doc)
+
+    def _update(self, query, update, upsert):
+        """Update the first matching document; returns (matched, upserted id)"""
+        found = self._find(query)
+        if found:
+            doc = dict(found[0])
+            _apply_update(doc, update, inserting=False)
+            self._store(doc, old=found[0])
+            return 1, None
+        if not upsert:
+            return 0, None
+        
+        doc = _new_document(query, update)
+        if doc["_id"] in self.docs:
+            raise _duplicate_key_error(self.name, "_id", doc["_id"])
+        self._store(doc)
+        return 0, doc["_id"]
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        fields = _index_fields(keys)
+        # Only single-field indexes speed up lookups here; compound ones are accepted as no-ops
+        if len(fields) == 1 and fields[0] != "_id":
+            field = fields[0]
+            if field not in self.indexes:
+                self.indexes[field] = {}
+                for doc in self.docs.values():
+                    self.indexes[field].setdefault(doc.get(field), set()).add(doc["_id"])
+            if unique:
+                self.unique.add(field)
+        return "_".join(f"{field}_1" for field in fields)
+
+    async def find_one(self, query=None, projection=None):
+        found = self._find(query)
+        return _project(found[0], projection) if found else None
+
+    def find(self, query=None, projection=None, batch_size=None, **kwargs):
+        return MemoryCursor(self._find(query), projection)
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise _duplicate_key_error(self.name, "_id", doc["_id"])
+        self._store(dict(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        matched, upserted_id = self._update(query, update, upsert)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        write_errors = []
+        for index, operation in enumerate(operations):
+            try:
+                matched, upserted_id = self._update(*_unpack(operation))
+            except DuplicateKeyError as e:
+                write_errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+                continue
+            if upserted_id is not None:
+                upserted_ids[index] = upserted_id
+        return _bulk_result(upserted_ids, write_errors)
+
+    async def delete_many(self, query):
+        found = self._find(query)
+        for doc in found:
+            self._unindex(doc)
+            del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(found))
+
+    async def count_documents(self, query):
+        return len(self._find(query))
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+class MemoryDatabase(Database):
+    """Process-local storage; everything is lost on restart"""
+
+    def _create_collection(self, name):
+        return MemoryCollection(name)
+
+def _encode_id(value):
+    # _id values are stored as extended JSON text so ObjectIds and strings both round-trip
+    return json_util.dumps(value)
+
+def _encode_doc(doc):
+    try:
+        return json_util.dumps({field: value for field, value in doc.items() if field != "_id"})
+    except TypeError as e:
+        raise InvalidDocument(str(e))
+
+def _decode_row(row):
+    return {"_id": json_util.loads(row[0]), **json_util.loads(row[1])}
+
+def _field_sql(field):
+    """SQL expression for a document field"""
+    if field == "_id":
+        return "_id"
+    if not FIELD_PATTERN.match(field):
+        raise ValueError(f"Unsupported field name {field!r}")
+    return f"json_extract(doc, '$.{field}')"
+
+def _where(query):
+    """Translate a query into a WHERE clause and its parameters"""
+    clauses = []
+    params = []
+    
+    for field, condition in (query or {}).items():
+        column = _field_sql(field)
+        bind = _encode_id if field == "_id" else (lambda value: value)
+        conditions = condition.items() if _is_operator_dict(condition) else [("$eq", condition)]
+        
+        for op, operand in conditions:
+            if op == "$eq":
+                if operand is None:
+                    clauses.append(f"{column} IS NULL")
+                else:
+                    clauses.append(f"{column} = ?")
+                    params.append(bind(operand))
+            elif op in COMPARISONS:
+                clauses.append(f"{column} {COMPARISONS[op][1]} ?")
+                params.append(bind(operand))
+            elif op == "$ne":
+                if operand is None:
+                    clauses.append(f"{column} IS NOT NULL")
+                else:
+                    clauses.append(f"({column} IS NULL OR {column} != ?)")
+                    params.append(bind(operand))
+            elif op == "$in":
+                values = [value for value in operand if value is not None]
+                parts = []
+                if values:
+                    parts.append(f"{column} IN ({', '.join('?' * len(values))})")
+                    params.extend(bind(value) for value in values)
+                if len(values) < len(operand):
+                    parts.append(f"{column} IS NULL")
+                clauses.append(f"({' OR '.join(parts)})" if parts else "0")
+            elif op == "$exists":
+                if field == "_id":
+                    clauses.append("1" if operand else "0")
+                else:
+                    clauses.append(f"json_type(doc, '$.{field}') IS {'NOT ' if operand else ''}NULL")
+            else:
+                raise NotImplementedError(f"Unsupported query operator {op}")
+    
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+class SQLiteCursor:
+    """Cursor that runs its query on the database's worker thread, fetching in batches"""
+
+    def __init__(self, collection, query, projection=None, batch_size=None):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.batch_size = batch_size or 1000
+        self._sort = None
+        self._limit = None
+
+    def sort(self, key, direction=1):
+        self._sort = (key, direction)
+        return self
+
+    def limit(self, count):
+        self._limit = count or None
+        return self
+
+    def _sql(self, length=None):
+        sql, params = self.collection._select(self.query)
+        if self._sort is not None:
+            key, direction = self._sort
+            sql += f" ORDER BY {_field_sql(key)} {'DESC' if direction < 0 else 'ASC'}"
+        
+        limits = [count for count in (self._limit, length) if count]
+        if limits:
+            sql += " LIMIT ?"
+            params.append(min(limits))
+        return sql, params
+
+    async def to_list(self, length=None):
+        sql, params = self._sql(length)
+
+        def fetch():
+            return self.collection._connection().execute(sql, params).fetchall()
+        
+        rows = await self.collection.database.run(fetch)
+        return [_project(_decode_row(row), self.projection) for row in rows]
+
+    async def __aiter__(self):
+        sql, params = self._sql()
+        database = self.collection.database
+        
+        # A separate read connection keeps one WAL snapshot across batches while writes go on
+        await database.run(self.collection._connection)
+        reader = sqlite3.connect(database.path, check_same_thread=False)
+        try:
+            cursor = await database.run(reader.execute, sql, params)
+            while True:
+                rows = await database.run(cursor.fetchmany, self.batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _project(_decode_row(row), self.projection)
+        finally:
+            reader.close()
+
+class SQLiteCollection:
+    """Collection stored as one SQLite table of JSON documents"""
+
+    def __init__(self, database, name):
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"Unsupported collection name {name!r}")
+        self.database = database
+        self.name = name
+        self._created = False
+
+    def _connection(self):
+        """Get the database connection, creating the table on first use (worker thread only)"""
+        conn = self.database.connection
+        if not self._created:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.name}" (_id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+            self._created = True
+        return conn
+
+    def _select(self, query):
+        where, params = _where(query)
+        return f'SELECT _id, doc FROM "{self.name}"{where}', params
+
+    def _update(self, conn, query, update, upsert):
+        """Update the first matching row; returns (matched, upserted id)"""
+        sql, params = self._select(query)
+        row = conn.execute(sql + " LIMIT 1", params).fetchone()
+        try:
+            if row is not None:
+                doc = _decode_row(row)
+                _apply_update(doc, update, inserting=False)
+                conn.execute(f'UPDATE "{self.name}" SET doc = ? WHERE _id = ?', (_encode_doc(doc), row[0]))
+                return 1, None
+            if not upsert:
+                return 0, None
+            
+            doc = _new_document(query, update)
+            conn.execute(
+                f'INSERT INTO "{self.name}" (_id, doc) VALUES (?, ?)',
+                (_encode_id(doc["_id"]), _encode_doc(doc))
+            )
+            return 0, doc["_id"]
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}: {e}", 11000)
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        fields = _index_fields(keys)
+        name = "_".join(f"{field}_1" for field in fields)
+        if fields == ["_id"]:
+            return name
+        
+        # Expression indexes are used by queries and sorts on the same json_extract() expression
+        columns = ", ".join(_field_sql(field) for field in fields)
+        sql = (
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS '
+            f'"{self.name}_{name.replace(".", "_")}" ON "{self.name}" ({columns})'
+        )
+        await self.database.run(lambda: self._connection().execute(sql))
+        return name
+
+    async def find_one(self, query=None, projection=None):
+        sql, params = self._select(query)
+
+        def fetch():
+            return self._connection().execute(sql + " LIMIT 1", params).fetchone()
+        
+        row = await self.database.run(fetch)
+        return _project(_decode_row(row), projection) if row is not None else None
+
+    def find(self, query=None, projection=None, batch_size=None, **kwargs):
+        return SQLiteCursor(self, query, projection, batch_size)
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+
+        def insert():
+            conn = self._connection()
+            try:
+                with conn:
+                    conn.execute(
+                        f'INSERT INTO "{self.name}" (_id, doc) VALUES (?, ?)',
+                        (_encode_id(doc["_id"]), _encode_doc(doc))
+                    )
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}: {e}", 11000)
+        
+        await self.database.run(insert)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        def write():
+            conn = self._connection()
+            with conn:
+                return self._update(conn, query, update, upsert)
+        
+        matched, upserted_id = await self.database.run(write)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def bulk_write(self, operations, ordered=True):
+        operations = [_unpack(operation) for operation in operations]
+
+        def write():
+            conn = self._connection()
+            upserted_ids = {}
+            write_errors = []
+            
+            # One transaction (and one WAL commit) for the whole batch
+            with conn:
+                for index, (query, update, upsert) in enumerate(operations):
+                    try:
+                        matched, upserted_id = self._update(conn, query, update, upsert)
+                    except DuplicateKeyError as e:
+                        write_errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                        if ordered:
+                            break
+                        continue
+                    if upserted_id is not None:
+                        upserted_ids[index] = upserted_id
+            return upserted_ids, write_errors
+        
+        return _bulk_result(*await self.database.run(write))
+
+    async def delete_many(self, query):
+        where, params = _where(query)
+        sql = f'DELETE FROM "{self.name}"{where}'
+
+        def delete():
+            conn = self._connection()
+            with conn:
+                return conn.execute(sql, params).rowcount
+        
+        return SimpleNamespace(deleted_count=await self.database.run(delete))
+
+    async def count_documents(self, query):
+        where, params = _where(query)
+        sql = f'SELECT COUNT(*) FROM "{self.name}"{where}'
+
+        def count():
+            return self._connection().execute(sql, params).fetchone()[0]
+        
+        return await self.database.run(count)
+
+    async def estimated_document_count(self):
+        return await self.count_documents({})
+
+class SQLiteDatabase(Database):
+    """Single-file storage in WAL mode; all queries run on one worker thread off the event loop"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _create_collection(self, name):
+        return SQLiteCollection(self, name)
+
+    @property
+    def connection(self):
+        """The shared connection, opened on first use (worker thread only)"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path)
+            # WAL lets readers run alongside the writer; NORMAL skips the fsync on every commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._conn = conn
+        return self._conn
+
+    async def run(self, func, *args):
+        """Run a blocking call on the worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def close(self):
+        """Close the connection and stop the worker thread"""
+        def close_connection():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        
+        await self.run(close_connection)
+        self._executor.shutdown(wait=False)
+
+def open_database(backend, sqlite_path="lisax.db"):
+    """Open a storage backend other than MongoDB by name"""
+    if backend == "memory":
+        return MemoryDatabase()
+    if backend == "sqlite":
+        return SQLiteDatabase(sqlite_path)
+    raise ValueError(f"Unknown storage backend {backend!r}")
@@ -0,0 +1,83 @@
+"""
+Tests for tracking writes in db.py, run against the in-memory storage backend
+"""
+import unittest
+
+import db
+from benchmarks.fakes import install_storage
+
+class ReactivationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await install_storage()
+
+    async def asyncTearDown(self):
+        await db.close_db()
+
+    async def _profile_write(self, **kwargs):
+        await db.add_user(user_id=42, username="user42", first_name="Lisa", last_name=None, **kwargs)
+
+    async def test_start_then_private_message_reactivates_user(self):
+        """/start tracks without active; the private-message write that follows must not be skipped"""
+        await self._profile_write()
+        await db.users_buffer.flush()
+        await db.mark_user_inactive(42, "blocked")
+        await db.users_buffer.flush()
+        self.assertFalse((await db.get_user(42))["active"])
+        
+        # The user unblocks the bot and sends /start: the command runs before the tracking handler
+        await self._profile_write()
+        await self._profile_write(active=True)
+        await db.users_buffer.flush()
+        self.assertTrue((await db.get_user(42))["active"])
+
+    async def test_group_message_after_reactivation_is_skipped(self):
+        """A write without active repeats the last one written, so it stays deduplicated"""
+        await self._profile_write(active=True)
+        await db.users_buffer.flush()
+        await self._profile_write()
+        self.assertEqual(db.users_buffer.pending, {})
+
+class KnownIdsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await install_storage()
+
+    async def asyncTearDown(self):
+        await db.close_db()
+
+    async def test_marking_unknown_chat_inactive_writes_nothing(self):
+        """Once the index is warmed, an id it has never seen is not upserted as an inactive stub"""
+        await db.add_chat(chat_id=-100, title="Known", chat_type="supergroup")
+        await db.chats_buffer.flush()
+        await db.warm_known_ids()
+        self.assertTrue(db.is_known_chat(-100))
+        self.assertFalse(db.is_known_chat(-200))
+        
+        await db.mark_chat_inactive(-100, "kicked")
+        await db.mark_chat_inactive(-200, "kicked")
+        await db.chats_buffer.flush()
+        self.assertFalse((await db.get_chat(-100))["active"])
+        self.assertIsNone(await db.get_chat(-200))
+
+    async def test_marking_chat_with_pending_first_write_inactive(self):
+        """A chat whose first write is still buffered is not in the index yet, but is marked all the same"""
+        await db.warm_known_ids()
+        await db.add_chat(chat_id=-300, title="New", chat_type="supergroup")
+        self.assertFalse(db.is_known_chat(-300))
+        
+        await db.mark_chat_inactive(-300, "kicked")
+        await db.chats_buffer.flush()
+        self.assertFalse((await db.get_chat(-300))["active"])
+
+    async def test_inexact_index_does_not_rule_ids_out(self):
+        """Worker processes warm inexact indexes, since other workers insert ids they never see"""
+        await db.warm_known_ids(exact=False)
+        self.assertIsNone(db.is_known_chat(-400))
+        
+        # Written by another process after the warm
+        await db.chats_collection.update_one({"chat_id": -400}, {"$set": {"chat_id": -400, "active": True}}, upsert=True)
+        await db.mark_chat_inactive(-400, "kicked")
+        await db.chats_buffer.flush()
+        self.assertFalse((await db.get_chat(-400))["active"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Command and button throttling: per-user and per-chat sliding-window limits checked before
+handlers run, so one user hammering /stats cannot slow the bot down for everyone else
+"""
+import logging
+from functools import wraps
+from pyrogram.types import CallbackQuery
+
+from ratelimit import SlidingWindowCounter
+from outbound import ReplyDropped
+from metrics import get_counter
+from config import OWNER_ID, THROTTLE_WINDOW, THROTTLE_USER_LIMIT, THROTTLE_CHAT_LIMIT, THROTTLE_TRACKED_KEYS
+
+logger = logging.getLogger(__name__)
+
+class Throttle:
+    """Sliding-window limits on handled commands and presses, per user and per chat"""
+
+    def __init__(self, window=THROTTLE_WINDOW, user_limit=THROTTLE_USER_LIMIT, chat_limit=THROTTLE_CHAT_LIMIT):
+        self.user_limit = user_limit
+        self.chat_limit = chat_limit
+        self.users = SlidingWindowCounter(window, THROTTLE_TRACKED_KEYS)
+        self.chats = SlidingWindowCounter(window, THROTTLE_TRACKED_KEYS)
+        self.throttled = get_counter("throttled")
+
+    def allow(self, user_id, chat_id=None):
+        """Count a request and check it is within limits; throttled requests are not counted"""
+        if user_id == OWNER_ID:
+            return True
+        
+        # A private chat is the user's own, so only the user limit applies there
+        if chat_id == user_id:
+            chat_id = None
+        
+        if (user_id is not None and self.users.count(user_id) >= self.user_limit) or \
+                (chat_id is not None and self.chats.count(chat_id) >= self.chat_limit):
+            self.throttled.inc()
+            logger.debug(f"Throttled user {user_id} in chat {chat_id}")
+            return False
+        
+        if user_id is not None:
+            self.users.add(user_id)
+        if chat_id is not None:
+            self.chats.add(chat_id)
+        return True
+
+    def allow_message(self, message):
+        """Check a command message against the limits of its sender and chat"""
+        sender = message.from_user or message.sender_chat
+        return self.allow(sender.id if sender else None, message.chat.id if message.chat else None)
+
+throttle = Throttle()
+
+def throttled_callback(func):
+    """Decorator answering throttled callback queries without running the handler"""
+    @wraps(func)
+    async def wrapper(client, callback_query: CallbackQuery):
+        message = callback_query.message
+        if throttle.allow(callback_query.from_user.id, message.chat.id if message else None):
+            try:
+                return await func(client, callback_query)
+            except ReplyDropped as e:
+                # The chat's sends are backed up; the press is given up rather than holding the handler
+                logger.debug(f"Button press not answered: {e}")
+                return
+        
+        # Answering is the cheapest way to end the button's loading state; nothing is rendered
+        await callback_query.answer("Slow down a little and try again in a few seconds.")
+    
+    return wrapper
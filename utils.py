@@ -4,10 +4,19 @@ import logging
 import asyncio
 import subprocess
 from functools import wraps
-from pyrogram.types import Message
+from pyrogram.enums import ChatType, ChatMembersFilter, ChatMemberStatus
+from pyrogram.errors import RPCError
+from pyrogram.types import Message, ChatMemberUpdated
+from cache import LRUCache
+from config import ADMIN_CACHE_TTL, ADMIN_CACHE_ERROR_TTL, ADMIN_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Administrator user ids per chat, fetched with a single admin-list request
+admin_cache = LRUCache(maxsize=ADMIN_CACHE_SIZE, ttl=ADMIN_CACHE_TTL)
+
+ADMIN_STATUSES = (ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR)
+
 def get_readable_time(seconds: int) -> str:
     """Convert seconds to readable time format"""
     count = 0
@@ -83,6 +92,45 @@ def get_readable_file_size(size_in_bytes: int) -> str:
     else:
         return f"{size:.2f} {size_units[size_index]}"
 
+async def get_chat_admins(client, chat_id):
+    """Get the ids of a chat's administrators, cached per chat"""
+    admins = admin_cache.get(chat_id)
+    if admins is not None:
+        return admins
+    
+    try:
+        admins = frozenset([
+            member.user.id
+            async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.ADMINISTRATORS)
+        ])
+        admin_cache.set(chat_id, admins)
+    except RPCError as e:
+        # Cache the failure briefly so repeated commands don't keep hitting the API
+        logger.warning(f"Could not get administrators of {chat_id}: {e}")
+        admins = frozenset()
+        admin_cache.set(chat_id, admins, ttl=ADMIN_CACHE_ERROR_TTL)
+    
+    return admins
+
+def invalidate_chat_admins(update: ChatMemberUpdated):
+    """Drop a chat's cached administrators when a member's admin status changes"""
+    old_status = update.old_chat_member.status if update.old_chat_member else None
+    new_status = update.new_chat_member.status if update.new_chat_member else None
+    
+    if old_status in ADMIN_STATUSES or new_status in ADMIN_STATUSES:
+        admin_cache.pop(update.chat.id)
+
+def removed_member_id(update: ChatMemberUpdated):
+    """Id of the user a member update removes from the chat, or None"""
+    member = update.new_chat_member or update.old_chat_member
+    if member is None or member.user is None:
+        return None
+    
+    # Leaving drops the new member entirely; kicks and bans leave it as banned/left
+    if update.new_chat_member is None or update.new_chat_member.status in (ChatMemberStatus.BANNED, ChatMemberStatus.LEFT):
+        return member.user.id
+    return None
+
 def is_admin(func):
     """Decorator to check if user is admin"""
     @wraps(func)
@@ -93,13 +141,12 @@ def is_admin(func):
             return await func(client, message)
         
         # If it's a private chat and not the owner, deny access
-        if message.chat.type == "private":
+        if message.chat.type == ChatType.PRIVATE:
             await message.reply_text("🚫 This command is only available to the bot owner.")
             return
         
         # Check if user is admin in the group
-        user = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if user.status in ["creator", "administrator"]:
+        if message.from_user.id in await get_chat_admins(client, message.chat.id):
             return await func(client, message)
         else:
             await message.reply_text("🚫 This command is only available to group admins.")
@@ -0,0 +1,91 @@
+"""
+Welcome messages for join storms: joins are buffered per chat over a short window and greeted
+with one message, at most one per chat every cooldown
+"""
+import time
+import asyncio
+import logging
+from pyrogram.errors import RPCError
+
+from cache import LRUCache
+from outbound import ReplyDropped
+from config import WELCOME_WINDOW, WELCOME_COOLDOWN, WELCOME_MAX_NAMES, DEFAULT_WELCOME_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# Longest a shutdown waits for the pending welcomes to go out
+FLUSH_TIMEOUT = 5
+
+def format_welcome(names, others=0):
+    """Welcome text for the given names, with the joins past the cap counted as others"""
+    if not names:
+        return DEFAULT_WELCOME_MESSAGE
+    if others:
+        return f"Welcome, {', '.join(names)} and {others} other{'s' if others != 1 else ''}! 👋"
+    if len(names) == 1:
+        return f"Welcome, {names[0]}! 👋"
+    return f"Welcome, {', '.join(names[:-1])} and {names[-1]}! 👋"
+
+class WelcomeAggregator:
+    """Collect joins per chat and send one welcome per window, no more than one per cooldown"""
+
+    def __init__(self, window=WELCOME_WINDOW, cooldown=WELCOME_COOLDOWN, max_names=WELCOME_MAX_NAMES):
+        self.window = window
+        self.cooldown = cooldown
+        self.max_names = max_names
+        self.pending = {}
+        self.last_sent = LRUCache(maxsize=10000, ttl=cooldown)
+        self._tasks = {}
+
+    def add(self, client, chat_id, names):
+        """Buffer joined members' names; the chat is welcomed once its window and cooldown are over"""
+        buffered = self.pending.setdefault(chat_id, {"names": [], "others": 0})
+        
+        # Names past the cap are only counted, so a raid cannot grow the buffer
+        room = self.max_names - len(buffered["names"])
+        buffered["names"].extend(names[:room])
+        buffered["others"] += max(len(names) - room, 0)
+        
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._send_later(client, chat_id))
+
+    async def _send_later(self, client, chat_id):
+        # Joins during the cooldown wait for it to end and go out together
+        cooldown_left = self.last_sent.get(chat_id, 0) + self.cooldown - time.monotonic()
+        try:
+            await asyncio.sleep(max(self.window, cooldown_left))
+        finally:
+            self._tasks.pop(chat_id, None)
+        await self._send(client, chat_id)
+
+    async def _send(self, client, chat_id):
+        buffered = self.pending.pop(chat_id, None)
+        if not buffered:
+            return False
+        
+        self.last_sent.set(chat_id, time.monotonic())
+        try:
+            await client.send_message(chat_id, format_welcome(buffered["names"], buffered["others"]))
+            return True
+        except (RPCError, ReplyDropped) as e:
+            logger.error(f"Error welcoming {len(buffered['names']) + buffered['others']} members in {chat_id}: {e}")
+            return False
+
+    async def stop(self, client):
+        """Send the pending welcomes now instead of waiting out their windows"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if self.pending:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(self._send(client, chat_id) for chat_id in list(self.pending))),
+                    FLUSH_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Pending welcome messages dropped on shutdown")
+            self.pending.clear()
+
+welcome_aggregator = WelcomeAggregator()
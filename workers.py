@@ -0,0 +1,314 @@
+"""
+Multi-process update handling: one ingest process owns the Telegram connection and fans raw
+updates out to worker processes by chat id; workers send API calls back through it
+"""
+import os
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing
+from pyrogram import raw, utils as pyrogram_utils
+from pyrogram.errors import RPCError
+from pyrogram.storage import MemoryStorage
+import pyrogram.errors
+
+import db
+from config import STORAGE_BACKEND
+from broadcast import shutdown_broadcast_jobs
+from metrics import instrument_client, instrument_router, register_gauge, runtime_sampler
+from priority import install_priority_queue
+from outbound import outbound_priority, ReplyDropped
+from welcome import welcome_aggregator
+
+logger = logging.getLogger(__name__)
+
+# Client methods workers may call in the ingest process
+REMOTE_METHODS = ("invoke", "resolve_peer")
+
+# Errors raised by the ingest process itself that workers' handlers catch by type
+LOCAL_ERRORS = {error.__name__: error for error in (ReplyDropped,)}
+
+# Seconds between checks for worker processes that exited
+SUPERVISE_INTERVAL = 5
+
+def partition_key(update):
+    """Chat id of a raw update (or the user id when there is no chat)"""
+    message = getattr(update, "message", None)
+    peer = getattr(message, "peer_id", None) or getattr(update, "peer", None)
+    if isinstance(peer, (raw.types.PeerUser, raw.types.PeerChat, raw.types.PeerChannel)):
+        return pyrogram_utils.get_peer_id(peer)
+    
+    # Member and participant updates carry bare ids; convert them the same way as peers
+    channel_id = getattr(update, "channel_id", None)
+    if isinstance(channel_id, int):
+        return pyrogram_utils.get_channel_id(channel_id)
+    chat_id = getattr(update, "chat_id", None)
+    if isinstance(chat_id, int):
+        return -chat_id
+    user_id = getattr(update, "user_id", None)
+    return user_id if isinstance(user_id, int) else 0
+
+def _bridge(mp_queue, loop, callback):
+    """Move items from a process queue onto the event loop (runs in its own daemon thread)"""
+    # Runs for the life of the process: API results can still arrive after a stop sentinel
+    while True:
+        loop.call_soon_threadsafe(callback, mp_queue.get())
+
+def _start_bridge(mp_queue, callback, name):
+    thread = threading.Thread(
+        target=_bridge,
+        args=(mp_queue, asyncio.get_running_loop(), callback),
+        name=name,
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def _encode_error(error):
+    """Describe an exception so the worker can raise an equivalent one"""
+    if isinstance(error, RPCError):
+        return (type(error).__name__, error.value, str(error))
+    if type(error).__name__ in LOCAL_ERRORS:
+        return (type(error).__name__, None, str(error))
+    return (None, None, f"{type(error).__name__}: {error}")
+
+def _decode_error(error):
+    name, value, text = error
+    if name in LOCAL_ERRORS:
+        return LOCAL_ERRORS[name](text)
+    error_class = getattr(pyrogram.errors, name, None) if name else None
+    if isinstance(error_class, type) and issubclass(error_class, RPCError):
+        return error_class(value=value)
+    # Anything else (network errors, timeouts) surfaces as a transient connection error
+    return ConnectionError(text)
+
+class PartitionedQueue(asyncio.Queue):
+    """Stands in for the dispatcher's update queue and routes updates to worker processes"""
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def put_nowait(self, item):
+        # None is the dispatcher's stop sentinel and stays local
+        if item is None:
+            super().put_nowait(item)
+            return
+        self.pool.route(item)
+
+class WorkerPool:
+    """Ingest side: start worker processes, route updates to them and run their API calls"""
+
+    def __init__(self, client, factory, factory_args, count):
+        self.client = client
+        self.factory = factory
+        self.factory_args = tuple(factory_args)
+        self.count = count
+        self.processes = []
+        self.inbound = []
+        self.outbound = None
+        self.routed = [0] * count
+        self.restarts = 0
+        # Set once the client is connected; workers' API calls wait for it
+        self.connected = asyncio.Event()
+        self._context = None
+        self._supervisor = None
+
+    def _spawn(self, index):
+        """Start the worker process for a partition; it reads that partition's inbound queue"""
+        process = self._context.Process(
+            target=run_worker,
+            args=(self.factory, self.factory_args, index, self.inbound[index], self.outbound),
+            name=f"LisaX-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def start(self):
+        """Start the workers; call before client.start() so no update is handled locally"""
+        if STORAGE_BACKEND == "memory":
+            logger.warning("Memory storage is private to each process; workers will not share users or chats")
+        
+        self._context = multiprocessing.get_context("spawn")
+        self.outbound = self._context.Queue()
+        self.inbound = [self._context.Queue() for _ in range(self.count)]
+        self.processes = [self._spawn(index) for index in range(self.count)]
+        
+        # Updates received by the client are fanned out instead of dispatched here
+        self.client.dispatcher.updates_queue = PartitionedQueue(self)
+        _start_bridge(self.outbound, self._on_request, "LisaX-outbound")
+        self._supervisor = asyncio.create_task(self._supervise())
+        register_gauge("Updates routed per worker", lambda: " / ".join(map(str, self.routed)))
+        register_gauge("Worker restarts", lambda: self.restarts)
+        logger.info(f"Started {self.count} update worker processes")
+
+    async def _supervise(self):
+        """Restart workers that exited, so their partition's updates are not left unhandled"""
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                # Updates still queued for the partition are picked up by the new process
+                logger.error(f"Worker {process.name} exited with code {process.exitcode}, restarting it")
+                self.processes[index] = self._spawn(index)
+                self.restarts += 1
+
+    def route(self, packet):
+        """Send an (update, users, chats) packet to the worker owning its chat"""
+        index = partition_key(packet[0]) % self.count
+        self.routed[index] += 1
+        self.inbound[index].put(("update", packet))
+
+    def _on_request(self, request):
+        asyncio.create_task(self._call(*request))
+
+    async def _call(self, index, request_id, method, args):
+        """Run a client method for a worker and send back the result or error"""
+        try:
+            if method not in REMOTE_METHODS:
+                raise ValueError(f"Method {method} cannot be called remotely")
+            
+            # Workers start before the client connects; their first calls wait for it
+            await self.connected.wait()
+            
+            # Sends keep the worker's priority (handler reply or broadcast); this task has its own context
+            if method == "invoke":
+                query, priority = args
+                outbound_priority.set(priority)
+                args = (query,)
+            result = await getattr(self.client, method)(*args)
+            reply = ("result", request_id, result, None)
+        except Exception as e:
+            reply = ("result", request_id, None, _encode_error(e))
+        self.inbound[index].put(reply)
+
+    async def stop(self, timeout=30):
+        """Let workers finish their queued updates and exit"""
+        # Workers exiting now are not restarted
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        
+        # Calls held back by a client that never connected fail now instead of blocking exit
+        self.connected.set()
+        for queue in self.inbound:
+            queue.put(None)
+        
+        # Keep answering API calls while workers drain
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not exit in {timeout}s, terminating")
+                process.terminate()
+        self.processes.clear()
+
+class RemoteClient:
+    """Worker side: forwards client API calls to the ingest process"""
+
+    def __init__(self, index, outbound):
+        self.index = index
+        self.outbound = outbound
+        self.pending = {}
+        self._ids = itertools.count()
+
+    async def call(self, method, *args):
+        # Replies to a worker that exited can still reach its restarted successor; the pid tells them apart
+        request_id = (os.getpid(), next(self._ids))
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        self.outbound.put((self.index, request_id, method, args))
+        try:
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def invoke(self, query, *args, **kwargs):
+        # Retries, timeouts, rate limits and short FloodWait sleeps are applied by the ingest client
+        return await self.call("invoke", query, outbound_priority.get())
+
+    async def resolve_peer(self, peer_id):
+        # The ingest process has seen every chat, so it holds all access hashes
+        return await self.call("resolve_peer", peer_id)
+
+    def resolve(self, request_id, result, error):
+        future = self.pending.get(request_id)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(_decode_error(error))
+        else:
+            future.set_result(result)
+
+async def _worker_main(factory, factory_args, index, inbound, outbound):
+    """Run the bot's handlers on updates routed from the ingest process"""
+    # The worker builds its own app (client, storage, handlers) inside its own event loop
+    app = factory(*factory_args)
+    bot = app.bot
+    
+    # API calls go through the ingest process; peers seen in updates are cached locally
+    remote = RemoteClient(index, outbound)
+    bot.invoke = remote.invoke
+    bot.resolve_peer = remote.resolve_peer
+    bot.storage = MemoryStorage(f"{bot.name}-worker-{index}")
+    await bot.storage.open()
+    
+    updates = asyncio.Queue()
+
+    def on_message(message):
+        # Results are resolved immediately so they never wait behind queued updates
+        if message is not None and message[0] == "result":
+            remote.resolve(*message[1:])
+        else:
+            updates.put_nowait(message)
+    
+    _start_bridge(inbound, on_message, f"LisaX-inbound-{index}")
+    
+    bot.me = await bot.get_me()
+    install_priority_queue(bot, app.router.prefixes)
+    await bot.dispatcher.start()
+    
+    # /metrics and /adminstats are answered here, so they report this worker's own figures
+    instrument_client(bot)
+    instrument_router(app.router)
+    runtime_sampler.start()
+    
+    # Other workers insert too, so this index answers lookups but is not an exact count
+    warming = asyncio.create_task(db.warm_known_ids(exact=False))
+    logger.info(f"Worker {index} ready")
+    
+    try:
+        while True:
+            message = await updates.get()
+            if message is None:
+                break
+            
+            # Same peer caching the client does before queueing updates itself
+            update, users, chats = message[1]
+            await bot.fetch_peers(list(users.values()))
+            await bot.fetch_peers(list(chats.values()))
+            bot.dispatcher.updates_queue.put_nowait((update, users, chats))
+    finally:
+        warming.cancel()
+        await bot.dispatcher.stop()
+        await welcome_aggregator.stop(bot)
+        await shutdown_broadcast_jobs()
+        await db.close_db()
+        await bot.storage.close()
+        logger.info(f"Worker {index} stopped")
+
+def run_worker(factory, factory_args, index, inbound, outbound):
+    """Worker process entry point; factory(*factory_args) builds the app (it must be picklable)"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    try:
+        asyncio.run(_worker_main(factory, factory_args, index, inbound, outbound))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        # The ingest process restarts the worker; this records why it exited
+        logger.exception(f"Worker {index} failed")
+        raise SystemExit(1)